@@ -0,0 +1,494 @@
+import os
+import glob
+import logging
+import time
+import uuid
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask_cors import CORS
+from optimization import optimize_outlet_location_fast as optimize_outlet_location, optimize_maximal_coverage, precompute_distances, build_distances_by_cost
+from visualization import visualize_map
+from osm_utils import load_graph_from_osrm_route, check_profile
+from catchment import compute_catchments
+from ingest import detect_format, read_demand_centers
+from scenarios import check_solver_options, expand_scenarios, scenario_costs, candidate_pool, run_scenarios, cost_curve
+from edge_costs import check_cost, cost_unit
+from serializers import negotiate_format, encode_json, json_response, table_response, write_table, read_table
+from snapshot import get_district_index, normalize_name, DEFAULT_POPULATION
+from metrics import span, log_payload, REGISTRY, PROMETHEUS_CONTENT_TYPE, REQUESTS_TOTAL
+from jobs import JobRegistry
+from task_queue import get_queue
+from profiling import profiling_requested, profiling_mode, profile_call, profile_access_allowed, PROFILE_DIR
+
+# Setup logging
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Flask app setup
+app = Flask(__name__)
+CORS(app)  # Enable CORS for cross-origin requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAPS_FOLDER = os.path.join(BASE_DIR, "maps")
+os.makedirs(MAPS_FOLDER, exist_ok=True)
+
+def remove_run_files(job):
+    """
+    Delete the map and tables a job wrote; they are all named with its run id as suffix.
+    """
+    for path in glob.glob(os.path.join(MAPS_FOLDER, f"*_{job.id}.*")):
+        os.remove(path)
+
+JOBS = JobRegistry(on_evict=remove_run_files)
+
+def check_options(options):
+    """
+    Validate the pipeline options of a request; raises ValueError for the 400 response.
+    """
+    check_cost(options.get('costType', 'distance'))
+    check_profile(options.get('routingProfile', 'driving'))
+    check_solver_options(options)
+    return options
+
+def find_district(lat, lon):
+    try:
+        names, _ = get_district_index().find_districts([lat], [lon])
+        if names[0] == "Unknown":
+            logging.warning("No district found for (%s, %s)", lat, lon)
+        return names[0]
+    except Exception as e:
+        logging.error("Error finding district: %s", e)
+        return "Error"
+
+def get_districts_with_population():
+    """
+    District polygons with a population column, used to estimate catchment coverage.
+    """
+    return get_district_index().to_geodataframe()
+
+def get_population_by_district(district_name):
+    try:
+        population = get_district_index().population_for_name(district_name, default=None)
+        if population is not None:
+            return int(population)
+        logging.warning("No population data found for %s. Using default.", normalize_name(district_name))
+        return DEFAULT_POPULATION
+    except Exception as e:
+        logging.error("Error fetching population for '%s': %s", district_name, e)
+        return DEFAULT_POPULATION  # Default value on error
+
+def assign_districts_and_population(demand_centers):
+    """
+    Resolve districts for all demand centers in one batched spatial index query and
+    fill missing populations from the joined census data.
+    """
+    import pandas as pd
+
+    with span('district_lookup'):
+        index = get_district_index()
+        districts, rows = index.find_districts(demand_centers['lat'].to_numpy(), demand_centers['lon'].to_numpy())
+        demand_centers['district'] = districts
+    with span('population_join'):
+        district_population = pd.Series(index.population_for_rows(rows), index=demand_centers.index)
+        if 'population' in demand_centers.columns:
+            population = pd.to_numeric(demand_centers['population'], errors='coerce')
+            demand_centers['population'] = population.fillna(district_population)
+        else:
+            demand_centers['population'] = district_population
+        demand_centers['population'] = demand_centers['population'].fillna(DEFAULT_POPULATION)
+        demand_centers.loc[demand_centers['population'] <= 0, 'population'] = DEFAULT_POPULATION
+    return demand_centers
+
+def process_demand_centers(demand_centers, options, fmt='json', progress=None, run_id=None):
+    """
+    Run the district lookup, optimization and map generation pipeline for a demand center table.
+    JSON responses carry every table; Arrow/Parquet responses carry the one selected by options['table'].
+    progress(event, data) receives the assignments and the map URL as soon as each is ready;
+    run_id keeps the output files of concurrent background jobs apart.
+    """
+    suffix = f"_{run_id}" if run_id else ""
+    check_options(options)
+    cost = options.get('costType', 'distance')
+    profile = options.get('routingProfile', 'driving')
+    demand_centers = assign_districts_and_population(demand_centers)
+
+    log_payload(logging.getLogger(), logging.DEBUG, "Final demand centers", demand_centers)
+
+    min_lat, max_lat = demand_centers['lat'].min(), demand_centers['lat'].max()
+    min_lon, max_lon = demand_centers['lon'].min(), demand_centers['lon'].max()
+
+    logging.info("Bounding box: (%s, %s) to (%s, %s)", min_lat, min_lon, max_lat, max_lon)
+
+    with span('graph_load'):
+        road_graph = load_graph_from_osrm_route(min_lat, min_lon, max_lat, max_lon, profile=profile)
+    if road_graph is None:
+        logging.warning("Road graph failed to load. Using GIS fallback.")
+        if fmt != 'json':
+            return table_response(demand_centers, fmt, {'message': 'GIS fallback used.'})
+        return json_response({
+            'message': 'GIS fallback used.',
+            'demand_centers': demand_centers
+        })
+
+    n_outlets = min(5, len(demand_centers))
+    initial_outlets = demand_centers.sample(n_outlets, random_state=42).reset_index(drop=True)
+    initial_outlets['id'] = range(1, n_outlets + 1)
+
+    log_payload(logging.getLogger(), logging.DEBUG, "Initialized outlets", initial_outlets)
+
+    logging.info("Optimizing outlet locations...")
+    with span('optimization'):
+        if options.get('mode') == 'coverage':
+            candidates = demand_centers[['lat', 'lon']].copy()
+            candidates['id'] = range(1, len(candidates) + 1)
+            assignments, optimized_outlets = optimize_maximal_coverage(
+                candidates, demand_centers, int(options.get('nOutlets', n_outlets)), float(options.get('coverageRadius', 25))
+            )
+        else:
+            assignments, optimized_outlets = optimize_outlet_location(initial_outlets, demand_centers, road_graph, cost=cost)
+    logging.info("Optimization completed.")
+    if progress:
+        progress('assignments', {'assignments': assignments.to_dict(orient='records'),
+                                 'outlets': optimized_outlets.to_dict(orient='records')})
+
+    catchments = []
+    catchment_budget = options.get('catchmentBudget')
+    if catchment_budget and float(catchment_budget) > 0:
+        logging.info("Computing catchments within %s %s...", catchment_budget, cost_unit(cost))
+        with span('catchments'):
+            catchments = compute_catchments(
+                optimized_outlets, road_graph, float(catchment_budget), weight=cost,
+                districts=get_districts_with_population()
+            )
+
+    map_file_path = os.path.join(MAPS_FOLDER, f"optimized_retail_map_with_connections{suffix}.geojson")
+    with span('map_generation'):
+        visualize_map(optimized_outlets, demand_centers, assignments, road_graph, map_file_path=map_file_path,
+                      catchments=catchments)
+    map_url = f'/download/{os.path.basename(map_file_path)}?t={int(time.time())}'
+    if progress:
+        progress('map', {'map_url': map_url})
+
+    tables = {'assignments': assignments, 'outlets': optimized_outlets}
+    if str(options.get('includeDistances', '')).lower() in ('1', 'true'):
+        distances = precompute_distances(optimized_outlets, demand_centers, road_graph, cost=cost)
+        tables['distances'] = distances.astype({'distance': 'float32'})
+
+    table_urls = {}
+    with span('result_tables'):
+        for name, df in tables.items():
+            table_file = f"optimized_retail_{name}{suffix}.parquet"
+            write_table(df, os.path.join(MAPS_FOLDER, table_file))
+            table_urls[name] = f'/download/{table_file}'
+
+    if fmt != 'json':
+        table = options.get('table', 'assignments')
+        if table not in tables:
+            return json_response({'error': f"Unknown table '{table}'. Use one of {', '.join(tables)}."}, status=400)
+        return table_response(tables[table], fmt, {'message': 'Optimization successful!', 'map_url': map_url})
+
+    return json_response({
+        'message': 'Optimization successful!',
+        'assignments': assignments,
+        'outlets': optimized_outlets,
+        'catchments': [{k: v for k, v in c.items() if k != 'geometry'} for c in catchments],
+        'map_url': map_url,
+        'tables': table_urls,
+    })
+
+def run_pipeline(demand_centers, options, fmt):
+    """
+    Run the pipeline, under the request profiler when profiling is enabled and asked for.
+    The profile is stored in the private PROFILE_DIR and linked from the X-Profile-Url header.
+    """
+    if not profiling_requested(request):
+        return process_demand_centers(demand_centers, options, fmt)
+    response, profile_file = profile_call(
+        process_demand_centers, demand_centers, options, fmt, mode=profiling_mode(request)
+    )
+    response = app.make_response(response)
+    response.headers['X-Profile-Url'] = f'/profiles/{profile_file}'
+    return response
+
+@app.route('/demand-centers', methods=['POST'])
+def demand_centers():
+    import pandas as pd
+
+    data = request.json
+    log_payload(logging.getLogger(), logging.INFO, "Received data", data)
+
+    if not data or not ('demandCenters' in data or 'locations' in data):
+        return jsonify({'error': 'Invalid data'}), 400
+
+    try:
+        fmt = negotiate_format(request)
+        check_options(dict(data, **request.args.to_dict()))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if 'demandCenters' in data:
+            demand_centers = pd.DataFrame(data['demandCenters']).rename(columns={'latitude': 'lat', 'longitude': 'lon'})
+            response = run_pipeline(demand_centers, dict(data, **request.args.to_dict()), fmt)
+            REQUESTS_TOTAL.inc(endpoint='demand-centers', outcome='success')
+            return response
+
+    except Exception as e:
+        REQUESTS_TOTAL.inc(endpoint='demand-centers', outcome='error')
+        logging.error("Error processing demand centers: %s", e)
+        return jsonify({'error': 'Failed to process data'}), 500
+
+@app.route('/demand-centers/batch', methods=['POST'])
+def batch_demand_centers():
+    """
+    Run many scenarios (e.g. p = 3..15 outlets, or different populationScale values) over one demand set.
+    District lookup, graph load and the distance matrix are computed once and shared by all solver runs.
+    With sharedRoutes=<cost>, every costType is measured along the routes minimizing that cost, in one traversal.
+    Streams NDJSON: one 'scenario' line per finished run, then a 'summary' line with the cost-vs-p curve.
+    """
+    import pandas as pd
+
+    data = request.json
+    if not data or 'demandCenters' not in data:
+        return jsonify({'error': 'Invalid data'}), 400
+    try:
+        scenarios = expand_scenarios(data)
+        check_profile(data.get('routingProfile', 'driving'))
+        shared_routes = data.get('sharedRoutes')
+        if shared_routes is not None:
+            check_cost(shared_routes)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        demand_centers = pd.DataFrame(data['demandCenters']).rename(columns={'latitude': 'lat', 'longitude': 'lon'})
+        if 'id' not in demand_centers.columns:
+            demand_centers['id'] = range(1, len(demand_centers) + 1)
+        demand_centers = assign_districts_and_population(demand_centers)
+        candidates = candidate_pool(demand_centers, scenarios)
+
+        distances = {}
+        costs = scenario_costs(scenarios)
+        if costs:
+            with span('graph_load'):
+                road_graph = load_graph_from_osrm_route(
+                    demand_centers['lat'].min(), demand_centers['lon'].min(),
+                    demand_centers['lat'].max(), demand_centers['lon'].max(),
+                    profile=data.get('routingProfile', 'driving'),
+                )
+            if road_graph is None:
+                REQUESTS_TOTAL.inc(endpoint='batch', outcome='error')
+                return jsonify({'error': 'Road graph failed to load.'}), 503
+            distances = build_distances_by_cost(candidates, demand_centers, road_graph, costs, along=shared_routes)
+    except Exception as e:
+        REQUESTS_TOTAL.inc(endpoint='batch', outcome='error')
+        logging.error("Error preparing batch: %s", e)
+        return jsonify({'error': 'Failed to process data'}), 500
+
+    batch_id = uuid.uuid4().hex[:12]
+    logging.info("Batch %s: %d scenarios over %d demand centers.", batch_id, len(scenarios), len(demand_centers))
+
+    def generate():
+        results = []
+        try:
+            with span('batch_scenarios'):
+                for result in run_scenarios(scenarios, demand_centers, candidates, distances):
+                    table_file = f"batch_{batch_id}_{result['index']}_assignments.parquet"
+                    write_table(result['assignments'], os.path.join(MAPS_FOLDER, table_file))
+                    results.append(result)
+                    line = {k: v for k, v in result.items() if k not in ('outlets', 'assignments')}
+                    line.update(type='scenario', outlets=result['outlets'].to_dict(orient='records'),
+                                assignments_url=f'/download/{table_file}')
+                    yield encode_json(line) + b"\n"
+            REQUESTS_TOTAL.inc(endpoint='batch', outcome='success')
+        except Exception as e:
+            REQUESTS_TOTAL.inc(endpoint='batch', outcome='error')
+            logging.error("Error in batch %s: %s", batch_id, e)
+            yield encode_json({'type': 'error', 'error': 'Failed to process scenario'}) + b"\n"
+        yield encode_json({'type': 'summary', 'batch': batch_id, 'completed': len(results),
+                           'scenarios': len(scenarios), 'curve': cost_curve(results)}) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def read_upload():
+    """
+    Demand centers from a multipart 'file' field or a raw CSV, Parquet or NDJSON request body.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        fmt = detect_format(upload.filename, upload.mimetype, request.args.get('format'))
+        stream = upload.stream
+    else:
+        fmt = detect_format(content_type=request.content_type, explicit=request.args.get('format'))
+        stream = request.stream
+    with span('ingest'):
+        return read_demand_centers(stream, fmt)
+
+@app.route('/demand-centers/upload', methods=['POST'])
+def upload_demand_centers():
+    """
+    Bulk ingestion of demand centers from a CSV, Parquet or NDJSON upload.
+    Accepts a multipart 'file' field or a raw request body; pipeline options are passed as query parameters.
+    """
+    try:
+        check_options(request.args.to_dict())
+        demand_centers = read_upload()
+        # ?format= names the upload format here, so the response format comes from the Accept header only
+        response_fmt = negotiate_format(request, allow_query=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if demand_centers.empty:
+        return jsonify({'error': 'Invalid data: no valid demand centers in upload'}), 400
+
+    try:
+        response = run_pipeline(demand_centers, request.args.to_dict(), response_fmt)
+        REQUESTS_TOTAL.inc(endpoint='upload', outcome='success')
+        return response
+    except Exception as e:
+        REQUESTS_TOTAL.inc(endpoint='upload', outcome='error')
+        logging.error("Error processing uploaded demand centers: %s", e)
+        return jsonify({'error': 'Failed to process data'}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Start the pipeline in the background. Takes the /demand-centers JSON body or an /demand-centers/upload file.
+    Progress is streamed from events_url as server-sent events; the final JSON result is served from result_url.
+    """
+    import pandas as pd
+
+    try:
+        if request.is_json:
+            data = request.json or {}
+            if 'demandCenters' not in data:
+                return jsonify({'error': 'Invalid data'}), 400
+            demand_centers = pd.DataFrame(data['demandCenters']).rename(columns={'latitude': 'lat', 'longitude': 'lon'})
+            options = dict(data, **request.args.to_dict())
+        else:
+            demand_centers = read_upload()
+            options = request.args.to_dict()
+        check_options(options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if demand_centers.empty:
+        return jsonify({'error': 'Invalid data: no demand centers'}), 400
+
+    job = JOBS.submit(process_demand_centers, demand_centers, options, 'json')
+    REQUESTS_TOTAL.inc(endpoint='jobs', outcome='accepted')
+    return jsonify({
+        'job_id': job.id,
+        'events_url': f'/jobs/{job.id}/events',
+        'result_url': f'/jobs/{job.id}',
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_result(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.result is None:
+        return jsonify({'job_id': job.id, 'status': job.status, 'events': len(job.events)}), 202
+    body, status, mimetype = job.result
+    return Response(body, status=status, mimetype=mimetype)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-sent events: 'stage' per finished pipeline stage, 'partial_assignments' per solver iteration,
+    'assignments' and 'map' as soon as they exist,
+    then 'done' or 'failed'. Reconnects resume after the Last-Event-ID header.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    return Response(
+        stream_with_context(job.stream(last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/tasks', methods=['POST'])
+def enqueue_task():
+    """
+    Queue the pipeline for a separate worker process (python worker.py) instead of running it here.
+    Takes the /demand-centers JSON body; poll status_url for the result.
+    """
+    data = request.json
+    if not data or 'demandCenters' not in data:
+        return jsonify({'error': 'Invalid data'}), 400
+    options = dict({k: v for k, v in data.items() if k != 'demandCenters'}, **request.args.to_dict())
+    try:
+        check_options(options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    task_id = get_queue().enqueue({'demandCenters': data['demandCenters'], 'options': options})
+    REQUESTS_TOTAL.inc(endpoint='tasks', outcome='accepted')
+    return jsonify({'task_id': task_id, 'status_url': f'/tasks/{task_id}'}), 202
+
+@app.route('/tasks/<task_id>', methods=['GET'])
+def task_status(task_id):
+    """
+    Task status and attempts; once done, the pipeline result plus URLs of the stored map and tables.
+    """
+    task = get_queue().get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    body = {k: task[k] for k in ('status', 'attempts', 'max_attempts', 'created', 'started', 'finished', 'error')}
+    body['task_id'] = task_id
+    if task['status'] == 'done':
+        body['result'] = task['result']
+        body['artifacts'] = {name: f'/tasks/{task_id}/artifacts/{name}' for name in task['artifacts']}
+    return jsonify(body), 200 if task['status'] in ('done', 'failed') else 202
+
+@app.route('/tasks/<task_id>/artifacts/<name>', methods=['GET'])
+def task_artifact(task_id, name):
+    data = get_queue().get_artifact(task_id, name)
+    if data is None:
+        return jsonify({'error': 'File not found'}), 404
+    mimetype = 'application/geo+json' if name.endswith('.geojson') else 'application/vnd.apache.parquet'
+    return Response(data, mimetype=mimetype)
+
+@app.route('/download/<filename>', methods=['GET'])
+def download_file(filename):
+    if filename.startswith('profile_'):
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        if filename.endswith('.parquet'):
+            fmt = negotiate_format(request)
+            if fmt != 'parquet':
+                path = os.path.join(MAPS_FOLDER, os.path.basename(filename))
+                if not os.path.exists(path):
+                    return jsonify({'error': 'File not found'}), 404
+                response = table_response(read_table(path), fmt)
+            else:
+                response = send_from_directory(MAPS_FOLDER, filename, as_attachment=False)
+        else:
+            response = send_from_directory(MAPS_FOLDER, filename, as_attachment=False)
+        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+        response.headers["Expires"] = "0"
+        response.headers["Pragma"] = "no-cache"
+        return response
+    except Exception as e:
+        logging.error("Error downloading file: %s", e)
+        return jsonify({'error': 'File not found'}), 404
+
+@app.route('/profiles/<filename>', methods=['GET'])
+def download_profile(filename):
+    """
+    Request profiles, only with profiling enabled and the X-Profile-Token header when a token is configured.
+    """
+    if not profile_access_allowed(request):
+        return jsonify({'error': 'File not found'}), 404
+    return send_from_directory(PROFILE_DIR, filename, as_attachment=True)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+if __name__ == '__main__':
+    app.run(debug=True)
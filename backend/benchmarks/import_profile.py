@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a fresh interpreter so nothing is pre-imported
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy_modules_loaded": heavy,
+}}))
+"""
+
+HEAVY_MODULES = ["geopandas", "networkx", "sklearn", "streamlit", "shapely", "pyarrow", "scipy", "pandas"]
+
+
+def parse_importtime(stderr, top=15):
+    """
+    Parse `python -X importtime` output into the slowest modules by cumulative microseconds.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)[:top]
+
+
+def profile_import(module="api", repeat=3, top=15):
+    """
+    Import a module in fresh interpreters and report wall time, peak RSS and the slowest imports.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    importtime = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    best = min(runs, key=lambda run: run["seconds"])
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "best_seconds": best["seconds"],
+        "median_seconds": sorted(run["seconds"] for run in runs)[len(runs) // 2],
+        "max_rss_kb": max(run["max_rss_kb"] for run in runs),
+        "modules": best["modules"],
+        "heavy_modules_loaded": best["heavy_modules_loaded"],
+        "slowest_imports": parse_importtime(importtime.stderr, top=top),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and memory of the API worker entry point.")
+    parser.add_argument("--module", default="api")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--max-seconds", type=float, help="Exit non-zero when the best import time exceeds this budget")
+    args = parser.parse_args()
+
+    report = profile_import(args.module, repeat=args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+    if args.max_seconds is not None and report["best_seconds"] > args.max_seconds:
+        sys.exit(f"Import of {args.module} took {report['best_seconds']:.3f}s, budget is {args.max_seconds:.3f}s")
@@ -0,0 +1,109 @@
+import argparse
+import hashlib
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SPEED_KMH = {'driving': 45.0, 'car': 45.0, 'bike': 15.0, 'cycling': 15.0, 'foot': 5.0, 'walking': 5.0}
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+def deterministic_route(start, end, profile='driving', points_per_100km=20, annotations=False):
+    """
+    Build a repeatable OSRM-shaped route between (lon, lat) pairs.
+    The polyline bends by a small offset derived from a hash of the endpoints, so identical
+    requests always return identical geometry without any real road data.
+    With annotations, legs carry per-segment distance/duration lists like OSRM's annotations=distance,duration.
+    """
+    (lon1, lat1), (lon2, lat2) = start, end
+    straight_km = _haversine_km(lat1, lon1, lat2, lon2)
+    n_points = max(2, int(straight_km / 100 * points_per_100km) + 2)
+    digest = hashlib.sha256(f"{lon1:.6f},{lat1:.6f};{lon2:.6f},{lat2:.6f}".encode()).digest()
+    bend = (digest[0] / 255 - 0.5) * 0.1  # Up to +/-5% of the span, perpendicular to it
+
+    coordinates = []
+    for i in range(n_points):
+        t = i / (n_points - 1)
+        offset = bend * math.sin(math.pi * t)
+        lon = lon1 + (lon2 - lon1) * t - (lat2 - lat1) * offset
+        lat = lat1 + (lat2 - lat1) * t + (lon2 - lon1) * offset
+        coordinates.append([round(lon, 6), round(lat, 6)])
+
+    speed = SPEED_KMH.get(profile, SPEED_KMH['driving'])
+    segments_km = [_haversine_km(a[1], a[0], b[1], b[0]) for a, b in zip(coordinates, coordinates[1:])]
+    distance_km = sum(segments_km)
+    duration_s = distance_km / speed * 3600
+    leg = {'distance': distance_km * 1000, 'duration': duration_s, 'steps': []}
+    if annotations:
+        leg['annotation'] = {
+            'distance': [km * 1000 for km in segments_km],
+            'duration': [km / speed * 3600 for km in segments_km],
+        }
+    return {
+        'code': 'Ok',
+        'routes': [{
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'distance': distance_km * 1000,
+            'duration': duration_s,
+            'legs': [leg],
+        }],
+        'waypoints': [{'location': coordinates[0]}, {'location': coordinates[-1]}],
+    }
+
+
+class OsrmStubHandler(BaseHTTPRequestHandler):
+    """
+    Serves /route/v1/<profile>/<lon>,<lat>;<lon>,<lat> with deterministic routes.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 4 or parts[0] != 'route':
+            return self._send(404, {'code': 'InvalidUrl', 'message': 'Only /route/v1/<profile>/<coordinates> is supported'})
+        try:
+            points = [tuple(float(v) for v in pair.split(',')) for pair in parts[3].split(';')]
+            if len(points) != 2:
+                raise ValueError
+        except ValueError:
+            return self._send(400, {'code': 'InvalidQuery', 'message': 'Expected two lon,lat coordinates'})
+        annotations = 'annotations' in parse_qs(url.query)
+        self._send(200, deterministic_route(points[0], points[1], profile=parts[2], annotations=annotations))
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+def start_stub_server(host='127.0.0.1', port=0):
+    """
+    Start the stub in a daemon thread. Returns (server, base_url); call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), OsrmStubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deterministic local OSRM stub for benchmarks.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), OsrmStubHandler)
+    print(f"OSRM stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,275 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import osm_utils  # noqa: E402
+from benchmarks.osrm_stub import start_stub_server  # noqa: E402
+from benchmarks.synthetic import DEMAND_GENERATORS, synthetic_road_graph  # noqa: E402
+
+DEFAULT_SIZES = (100, 1_000, 10_000)
+GRAPH_SOURCES = ('synthetic', 'osrm')  # Graph the routing stages run on
+ROUTING_STAGES = ('snapping', 'distance_matrix', 'sparse_distances', 'optimization', 'map_generation')
+# Largest demand set each stage is run for; the per-pair stages are far too slow beyond these
+STAGE_LIMITS = {
+    'district_lookup': 10 ** 6,
+    'graph_load': 10 ** 6,
+    'synthetic_graph': 10 ** 6,
+    'snapping': 10 ** 6,
+    'distance_matrix': 100,
+    'sparse_distances': 10 ** 6,
+    'optimization': 100,
+    'coverage': 10 ** 6,
+    'map_generation': 1_000,
+}
+
+
+class Scenario:
+    """
+    Shared inputs for one (generator, size, seed) benchmark case, built lazily by the stages.
+    The routing stages run on the synthetic network (graph_source='synthetic') or on the
+    graph loaded from the OSRM stub ('osrm').
+    """
+
+    def __init__(self, generator, size, seed, n_outlets=5, graph_nodes=500, graph_source='synthetic'):
+        self.generator = generator
+        self.size = size
+        self.seed = seed
+        self.n_outlets = n_outlets
+        self.graph_nodes = graph_nodes
+        self.graph_source = graph_source
+        self.demand = DEMAND_GENERATORS[generator](size, seed=seed)
+        self.outlets = self.demand.sample(min(n_outlets, size), random_state=seed).reset_index(drop=True)
+        self.outlets['id'] = range(1, len(self.outlets) + 1)
+        self.graphs = {}
+
+    @property
+    def road_graph(self):
+        return self.graphs.get(self.graph_source)
+
+
+def stage_district_lookup(scenario):
+    from snapshot import current_snapshot_path, get_district_index
+
+    if current_snapshot_path() is None:
+        return 'skipped: no district snapshot (run python snapshot.py)'
+    get_district_index().find_districts(scenario.demand['lat'].to_numpy(), scenario.demand['lon'].to_numpy())
+
+
+def stage_graph_load(scenario):
+    osm_utils.OSRM_CACHE.clear()
+    demand = scenario.demand
+    scenario.graphs['osrm'] = osm_utils.load_graph_from_osrm_route(
+        demand['lat'].min(), demand['lon'].min(), demand['lat'].max(), demand['lon'].max()
+    )
+
+
+def stage_synthetic_graph(scenario):
+    from edge_costs import attach_edge_costs
+
+    graph = synthetic_road_graph(scenario.graph_nodes, seed=scenario.seed)
+    attach_edge_costs(graph)
+    scenario.graphs['synthetic'] = graph
+
+
+def stage_snapping(scenario):
+    sample = scenario.demand.head(50)
+    for lat, lon in zip(sample['lat'], sample['lon']):
+        osm_utils.find_nearest_node(scenario.road_graph, lat, lon)
+
+
+def stage_distance_matrix(scenario):
+    from optimization import precompute_distances
+    precompute_distances(scenario.outlets, scenario.demand, scenario.road_graph)
+
+
+def stage_sparse_distances(scenario):
+    from sparse_distances import build_sparse_distances
+
+    candidates = scenario.demand.sample(min(1_000, scenario.size), random_state=scenario.seed).reset_index(drop=True)
+    candidates['id'] = range(1, len(candidates) + 1)
+    build_sparse_distances(candidates, scenario.demand, scenario.road_graph, k=8)
+
+
+def stage_optimization(scenario):
+    from optimization import optimize_outlet_location_fast
+    optimize_outlet_location_fast(scenario.outlets.copy(), scenario.demand, scenario.road_graph)
+
+
+def stage_coverage(scenario):
+    from optimization import optimize_maximal_coverage
+
+    candidates = scenario.demand.sample(min(1_000, scenario.size), random_state=scenario.seed)[['id', 'lat', 'lon']]
+    optimize_maximal_coverage(candidates, scenario.demand, n_outlets=10, radius_km=50)
+
+
+def stage_map_generation(scenario):
+    from optimization import assign_demand_to_outlets_fast, haversine_matrix
+    from visualization import visualize_map
+    import pandas as pd
+
+    distances = haversine_matrix(scenario.outlets, scenario.demand)
+    long_form = pd.DataFrame({
+        'outlet_id': scenario.outlets['id'].to_numpy().repeat(len(scenario.demand)),
+        'demand_id': list(scenario.demand['id']) * len(scenario.outlets),
+        'distance': distances.ravel(),
+    })
+    assignments = assign_demand_to_outlets_fast(long_form, scenario.demand)
+    visualize_map(scenario.outlets, scenario.demand, assignments, scenario.road_graph)
+
+
+STAGES = [
+    ('district_lookup', stage_district_lookup),
+    ('graph_load', stage_graph_load),
+    ('synthetic_graph', stage_synthetic_graph),
+    ('snapping', stage_snapping),
+    ('distance_matrix', stage_distance_matrix),
+    ('sparse_distances', stage_sparse_distances),
+    ('optimization', stage_optimization),
+    ('coverage', stage_coverage),
+    ('map_generation', stage_map_generation),
+]
+
+
+def run_stage(name, stage, scenario, repeat=1, trace_memory=True):
+    """
+    Time a stage (best of `repeat` untraced runs) and, separately, measure its peak traced allocation.
+    """
+    if scenario.size > STAGE_LIMITS.get(name, 0):
+        return {'status': f'skipped: size above limit {STAGE_LIMITS.get(name, 0)}'}
+    if name in ROUTING_STAGES and scenario.road_graph is None:
+        return {'status': f'skipped: no {scenario.graph_source} road graph'}
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        status = stage(scenario)
+        timings.append(time.perf_counter() - start)
+        if status:
+            return {'status': status}
+
+    result = {'status': 'ok', 'seconds': min(timings), 'runs': timings}
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        stage(scenario)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mb'] = peak / 2 ** 20
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, generators=tuple(DEMAND_GENERATORS), stages=None, seed=42, repeat=1,
+                   trace_memory=True, graph_source='synthetic', graph_nodes=500):
+    """
+    Run every selected stage for every (generator, size) scenario against a local OSRM stub.
+    Routing stages use the graph named by graph_source, which its loading stage must have built.
+    """
+    server, stub_url = start_stub_server()
+    previous_url = osm_utils.OSRM_URL
+    osm_utils.OSRM_URL = stub_url
+    results = []
+    try:
+        for generator in generators:
+            for size in sizes:
+                scenario = Scenario(generator, size, seed, graph_nodes=graph_nodes, graph_source=graph_source)
+                for name, stage in STAGES:
+                    if stages and name not in stages:
+                        continue
+                    record = {'scenario': generator, 'size': size, 'stage': name}
+                    record.update(run_stage(name, stage, scenario, repeat=repeat, trace_memory=trace_memory))
+                    results.append(record)
+                    print(f"{generator:>9} {size:>8} {name:<16} {record.get('seconds', float('nan')):9.4f}s "
+                          f"{record.get('peak_mb', float('nan')):9.1f} MB  {record['status']}", file=sys.stderr)
+    finally:
+        osm_utils.OSRM_URL = previous_url
+        server.shutdown()
+
+    return {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'graph': graph_source,
+        'graph_nodes': graph_nodes,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=1.2):
+    """
+    Compare two result files. Returns rows (key, baseline_s, current_s, ratio) and the regressions above threshold.
+    """
+    def index(report):
+        return {(r['scenario'], r['size'], r['stage']): r for r in report['results'] if r.get('status') == 'ok'}
+
+    base, cur = index(baseline), index(current)
+    rows, regressions = [], []
+    for key in sorted(base.keys() & cur.keys()):
+        ratio = cur[key]['seconds'] / max(base[key]['seconds'], 1e-9)
+        rows.append((key, base[key]['seconds'], cur[key]['seconds'], ratio))
+        if ratio > threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reproducible pipeline benchmarks on synthetic data.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark suite')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    run_parser.add_argument('--generators', nargs='+', default=list(DEMAND_GENERATORS), choices=list(DEMAND_GENERATORS))
+    run_parser.add_argument('--stages', nargs='+', choices=[name for name, _ in STAGES])
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--repeat', type=int, default=1)
+    run_parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak-memory pass')
+    run_parser.add_argument('--graph', choices=GRAPH_SOURCES, default='synthetic', help='Road graph for the routing stages')
+    run_parser.add_argument('--graph-nodes', type=int, default=500, help='Nodes in the synthetic road network')
+    run_parser.add_argument('--output', default='bench_results.json')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.2, help='Slowdown ratio that counts as a regression')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        report = run_benchmarks(args.sizes, args.generators, args.stages, args.seed, args.repeat, not args.no_memory,
+                                args.graph, args.graph_nodes)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.threshold)
+    for (scenario, size, stage), base_s, cur_s, ratio in rows:
+        flag = '  REGRESSION' if (scenario, size, stage) in regressions else ''
+        print(f"{scenario:>9} {size:>8} {stage:<16} {base_s:9.4f}s -> {cur_s:9.4f}s  x{ratio:5.2f}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+INDIA_BBOX = (6.5, 68.1, 35.5, 97.4)  # (min_lat, min_lon, max_lat, max_lon)
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.32
+
+
+def _populations(rng, n):
+    # Town populations are heavy-tailed; a lognormal keeps them positive and realistic
+    return np.round(rng.lognormal(mean=10, sigma=1.2, size=n)).astype(np.int64) + 100
+
+
+def uniform_demand(n, seed=0, bbox=INDIA_BBOX):
+    """
+    n demand centers spread uniformly over the bounding box.
+    """
+    rng = np.random.default_rng(seed)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'lat': rng.uniform(min_lat, max_lat, n),
+        'lon': rng.uniform(min_lon, max_lon, n),
+        'population': _populations(rng, n),
+    })
+
+
+def clustered_demand(n, seed=0, bbox=INDIA_BBOX, n_clusters=None, spread_km=25.0):
+    """
+    n demand centers grouped around random city centers, with a few large clusters dominating.
+    """
+    rng = np.random.default_rng(seed)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    n_clusters = n_clusters or max(1, int(np.sqrt(n) / 2))
+    centers = np.column_stack([rng.uniform(min_lat, max_lat, n_clusters), rng.uniform(min_lon, max_lon, n_clusters)])
+    weights = rng.pareto(1.5, n_clusters) + 1
+    membership = rng.choice(n_clusters, size=n, p=weights / weights.sum())
+    offsets = rng.normal(scale=spread_km / KM_PER_DEGREE, size=(n, 2))
+    coords = centers[membership] + offsets
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'lat': np.clip(coords[:, 0], min_lat, max_lat),
+        'lon': np.clip(coords[:, 1], min_lon, max_lon),
+        'population': _populations(rng, n),
+    })
+
+
+DEMAND_GENERATORS = {'uniform': uniform_demand, 'clustered': clustered_demand}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def synthetic_road_graph(n_nodes, seed=0, bbox=INDIA_BBOX, k=4, detour=1.25):
+    """
+    Random road network: nodes uniform in the bounding box, each joined to its k nearest neighbours.
+    Nodes are (lon, lat) tuples and edges carry 'weight' in km, like load_graph_from_osrm_route.
+    """
+    import networkx as nx
+    from scipy.spatial import cKDTree
+
+    rng = np.random.default_rng(seed)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    lons = rng.uniform(min_lon, max_lon, n_nodes)
+    lats = rng.uniform(min_lat, max_lat, n_nodes)
+    _, neighbours = cKDTree(np.column_stack([lons, lats])).query(np.column_stack([lons, lats]), k=min(k + 1, n_nodes))
+
+    graph = nx.Graph()
+    nodes = [(float(lon), float(lat)) for lon, lat in zip(lons, lats)]
+    graph.add_nodes_from(nodes)
+    for i, row in enumerate(neighbours):
+        for j in row[1:]:
+            distance = haversine_km(lats[i], lons[i], lats[j], lons[j]) * detour
+            graph.add_edge(nodes[i], nodes[j], weight=float(distance))
+    return graph
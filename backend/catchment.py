@@ -0,0 +1,114 @@
+import logging
+
+from edge_costs import COSTS, cost_weight
+from sparse_distances import snap_to_nodes
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.32  # Approximate length of one degree of latitude
+
+
+def reachable_nodes(road_graph, source, budget, weight="weight"):
+    """
+    Run one bounded Dijkstra from a graph node.
+    Returns a dict of reachable node -> cost, limited to the given budget.
+    weight may be an edge attribute or a cost name from edge_costs.COSTS (e.g. 'peak' for peak-hour minutes).
+    """
+    import networkx as nx
+
+    if source is None:
+        return {}
+    if weight in COSTS:
+        weight = cost_weight(road_graph, weight)
+    return nx.single_source_dijkstra_path_length(road_graph, source, cutoff=budget, weight=weight)
+
+
+def catchment_polygon(nodes, buffer_km=1.0, ratio=0.3):
+    """
+    Turn the reachable nodes of a catchment into a polygon using a concave hull.
+    Degenerate hulls (a single node or nodes along one road) are buffered instead.
+    """
+    import shapely
+    from shapely.geometry import MultiPoint
+
+    if not nodes:
+        return None
+    hull = shapely.concave_hull(MultiPoint(list(nodes)), ratio=ratio)
+    buffer_deg = buffer_km / KM_PER_DEGREE
+    if hull.geom_type != "Polygon" or hull.area == 0:
+        return hull.buffer(buffer_deg)
+    return hull.buffer(buffer_deg / 10)
+
+
+def covered_population(polygon, districts):
+    """
+    Estimate the population inside a catchment polygon.
+    Each intersecting district contributes its population weighted by the overlapping area share.
+    """
+    if polygon is None or districts is None or districts.empty:
+        return 0
+    candidates = districts.sindex.query(polygon, predicate="intersects")
+    total = 0.0
+    for idx in candidates:
+        district = districts.iloc[idx]
+        area = district.geometry.area
+        if area > 0:
+            total += district["population"] * district.geometry.intersection(polygon).area / area
+    return int(round(total))
+
+
+def compute_catchment(road_graph, outlet, source, budget, weight="weight", districts=None):
+    """
+    Compute the catchment of a single outlet within a travel budget, starting from its snapped graph node.
+    """
+    costs = reachable_nodes(road_graph, source, budget, weight=weight)
+    polygon = catchment_polygon(costs.keys())
+    return {
+        "outlet_id": outlet["id"],
+        "budget": budget,
+        "reachable_nodes": len(costs),
+        "max_cost": max(costs.values(), default=0.0),
+        "population": covered_population(polygon, districts),
+        "geometry": polygon,
+    }
+
+
+def compute_catchments(outlets, road_graph, budget, weight="weight", districts=None):
+    """
+    Compute catchments for all outlets, one bounded Dijkstra per outlet.
+    Outlets are snapped to the graph in one nearest-neighbour query; the Dijkstra runs then take
+    milliseconds each, so they stay in the calling thread.
+    The budget is expressed in the unit of the edge weight (km for the default 'weight').
+    """
+    outlet_records = outlets[["id", "lat", "lon"]].to_dict(orient="records")
+    if road_graph.number_of_nodes() == 0:
+        sources = [None] * len(outlet_records)
+    else:
+        sources = snap_to_nodes(road_graph, outlets["lat"].to_numpy(float), outlets["lon"].to_numpy(float))
+    return [
+        compute_catchment(road_graph, outlet, source, budget, weight=weight, districts=districts)
+        for outlet, source in zip(outlet_records, sources)
+    ]
+
+
+def catchment_features(catchments):
+    """
+    Convert computed catchments into GeoJSON polygon features for the map output.
+    """
+    features = []
+    for catchment in catchments:
+        if catchment["geometry"] is None:
+            continue
+        features.append({
+            'type': 'Feature',
+            'geometry': catchment["geometry"].__geo_interface__,
+            'properties': {
+                'outlet_id': catchment['outlet_id'],
+                'type': 'catchment',
+                'budget': catchment['budget'],
+                'population': catchment['population'],
+                'fill': '#0000FF',
+                'fill-opacity': 0.15,
+            }
+        })
+    return features
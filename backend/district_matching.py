@@ -0,0 +1,203 @@
+import argparse
+import json
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+# "Urban" too: the census lists e.g. "Bengaluru" where the shapefile has "Bangalore Urban"
+DROP_TOKENS = {"district", "dist", "distt", "the", "urban"}
+# Spelling variants that trigram similarity alone does not bridge
+ALIASES = {
+    "bangalore": "bengaluru",
+    "gurgaon": "gurugram",
+    "allahabad": "prayagraj",
+    "faizabad": "ayodhya",
+    "mysore": "mysuru",
+    "belgaum": "belagavi",
+    "gulbarga": "kalaburagi",
+    "bellary": "ballari",
+    "shimoga": "shivamogga",
+    "tumkur": "tumakuru",
+    "bijapur": "vijayapura",
+}
+MATCH_THRESHOLD = 0.8  # Minimum normalized edit similarity to accept a fuzzy match
+AMBIGUITY_MARGIN = 0.05  # Best candidate must beat the runner-up by this much
+
+
+def _join_number_words(tokens):
+    """
+    Collapse number words into digits: "twenty four" -> "24", "twenty" -> "20".
+    """
+    result, i = [], 0
+    while i < len(tokens):
+        value = NUMBER_WORDS.get(tokens[i])
+        if value is None:
+            result.append(tokens[i])
+            i += 1
+            continue
+        if value >= 20 and i + 1 < len(tokens) and NUMBER_WORDS.get(tokens[i + 1], 10) < 10:
+            value += NUMBER_WORDS[tokens[i + 1]]
+            i += 1
+        result.append(str(value))
+        i += 1
+    return result
+
+
+def normalize_district(name):
+    """
+    Canonical form used for matching: ASCII, lowercase, no punctuation or parenthesized qualifiers,
+    digits for number words, without filler tokens such as "district", and with known renames applied.
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"\(.*?\)", " ", text).replace(".", "").replace("&", " and ")
+    text = re.sub(r"[^a-z0-9 ]+", " ", text)
+    tokens = [token for token in text.split() if token not in DROP_TOKENS]
+    tokens = [ALIASES.get(token, token) for token in _join_number_words(tokens)]
+    return " ".join(tokens)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a, b):
+    """
+    Edit distance with a two-row dynamic program.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    if not a and not b:
+        return 1.0
+    return 1 - levenshtein(a, b) / max(len(a), len(b))
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index over normalized names for fast candidate lookup.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.postings = defaultdict(list)
+        self.sizes = []
+        for idx, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(idx)
+
+    def candidates(self, query, limit=10):
+        """
+        Top candidates by Dice coefficient of shared trigrams.
+        """
+        grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in grams:
+            for idx in self.postings.get(gram, ()):
+                shared[idx] += 1
+        scored = [(2 * count / (len(grams) + self.sizes[idx]), idx) for idx, count in shared.items()]
+        return [idx for _, idx in sorted(scored, reverse=True)[:limit]]
+
+
+def match_districts(district_names, population_df, threshold=MATCH_THRESHOLD, margin=AMBIGUITY_MARGIN):
+    """
+    Resolve every shapefile district name against the census table.
+    Returns (populations aligned with district_names, None where unresolved; report dict).
+    """
+    census = population_df.dropna(subset=["district", "population"])
+    census_names = [normalize_district(name) for name in census["district"]]
+    census_populations = census["population"].astype("int64").tolist()
+    census_raw = census["district"].tolist()
+
+    exact = {}
+    for idx, name in enumerate(census_names):
+        exact.setdefault(name, idx)  # First row wins on duplicates, like the CSV lookup did
+    index = TrigramIndex(census_names)
+
+    populations, matched, fuzzy, unmatched, ambiguous = [], 0, [], [], []
+    for raw_name in district_names:
+        name = normalize_district(raw_name)
+        if name in exact:
+            populations.append(census_populations[exact[name]])
+            matched += 1
+            continue
+
+        scored = sorted(
+            ((similarity(name, census_names[idx]), idx) for idx in index.candidates(name)),
+            reverse=True,
+        )
+        if not scored or scored[0][0] < threshold:
+            populations.append(None)
+            unmatched.append({
+                "district": raw_name,
+                "best_candidate": census_raw[scored[0][1]] if scored else None,
+                "score": round(scored[0][0], 3) if scored else None,
+            })
+            continue
+        best_score, best_idx = scored[0]
+        if len(scored) > 1 and best_score - scored[1][0] < margin and census_names[scored[1][1]] != census_names[best_idx]:
+            populations.append(None)
+            ambiguous.append({
+                "district": raw_name,
+                "candidates": [{"name": census_raw[idx], "score": round(score, 3)} for score, idx in scored[:3]],
+            })
+            continue
+        populations.append(census_populations[best_idx])
+        fuzzy.append({"district": raw_name, "census_name": census_raw[best_idx], "score": round(best_score, 3)})
+
+    report = {
+        "total": len(populations),
+        "exact": matched,
+        "fuzzy": fuzzy,
+        "unmatched": unmatched,
+        "ambiguous": ambiguous,
+    }
+    logger.info(
+        "District matching: %d exact, %d fuzzy, %d ambiguous, %d unmatched of %d.",
+        matched, len(fuzzy), len(ambiguous), len(unmatched), len(populations),
+    )
+    return populations, report
+
+
+if __name__ == "__main__":
+    from snapshot import DISTRICTS_FILE, POPULATION_DATA_FILE, read_population_csv
+
+    parser = argparse.ArgumentParser(description="Report how shapefile district names resolve against the census CSV.")
+    parser.add_argument("--districts", default=DISTRICTS_FILE)
+    parser.add_argument("--population", default=POPULATION_DATA_FILE)
+    parser.add_argument("--output", help="Write the full JSON report to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    import geopandas as gpd
+    names = gpd.read_file(args.districts, ignore_geometry=True)["NAME_2"].fillna("").astype(str).tolist()
+    _, report = match_districts(names, read_population_csv(args.population))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    for entry in report["ambiguous"]:
+        print(f"AMBIGUOUS {entry['district']}: {', '.join(c['name'] for c in entry['candidates'])}")
+    for entry in report["unmatched"]:
+        print(f"UNMATCHED {entry['district']} (closest: {entry['best_candidate']}, {entry['score']})")
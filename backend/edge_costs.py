@@ -0,0 +1,182 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cost columns carried by every edge: distance in km, all others travel time in minutes
+COSTS = ("distance", "freeflow", "peak", "truck", "cycling")
+PEAK_FACTOR = float(os.getenv("PEAK_TRAFFIC_FACTOR", "1.6"))  # Peak-hour slowdown over free-flow driving
+DRIVING_SPEED_KMH = 45.0  # Free-flow speed when OSRM reports no duration (e.g. synthetic graphs)
+PROFILE_SPEEDS_KMH = {"truck": 40.0, "cycling": 15.0}
+SOURCE_CHUNK = 256  # Sources per csgraph call, bounding the (sources x nodes) work arrays
+
+
+def check_cost(cost):
+    if cost not in COSTS:
+        raise ValueError(f"Unknown cost '{cost}'. Use one of {', '.join(COSTS)}.")
+    return cost
+
+
+def cost_unit(cost):
+    return "km" if check_cost(cost) == "distance" else "min"
+
+
+def edge_cost_columns(distance_km, freeflow_min=None):
+    """
+    All cost columns for edges of the given lengths, as a float32 (n_edges, len(COSTS)) array.
+    Free-flow time comes from OSRM when available; the other times are derived from it or from profile speeds.
+    """
+    distance_km = np.asarray(distance_km, dtype=np.float64)
+    if freeflow_min is None:
+        freeflow_min = distance_km / DRIVING_SPEED_KMH * 60
+    freeflow_min = np.asarray(freeflow_min, dtype=np.float64)
+    return np.column_stack([
+        distance_km,
+        freeflow_min,
+        freeflow_min * PEAK_FACTOR,
+        np.maximum(freeflow_min, distance_km / PROFILE_SPEEDS_KMH["truck"] * 60),  # Trucks are capped below car speed
+        distance_km / PROFILE_SPEEDS_KMH["cycling"] * 60,
+    ]).astype(np.float32)
+
+
+def straight_line_cost(distance_km, cost):
+    """
+    Estimate a cost from a straight-line distance, for pairs the graph cannot connect.
+    """
+    return float(edge_cost_columns([distance_km])[0, COSTS.index(check_cost(cost))])
+
+
+class EdgeCosts:
+    """
+    Every cost of every edge in one contiguous (n_edges, n_costs) float32 array, with the edge endpoints
+    as node positions. Built once per graph; networkx edges point into it through their 'eid' attribute.
+    """
+
+    def __init__(self, nodes, u, v, costs):
+        self.nodes = nodes
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.u = u
+        self.v = v
+        self.costs = costs
+        self._csr = {}
+        self._edge_ids = None
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = list(graph.edges(data=True))
+        u = np.array([index[a] for a, _, _ in edges], dtype=np.int32)
+        v = np.array([index[b] for _, b, _ in edges], dtype=np.int32)
+        distance = [d.get("weight", 0.0) for _, _, d in edges]
+        durations = [d.get("duration") for _, _, d in edges]
+        if any(duration is None for duration in durations):
+            durations = None
+        return cls(nodes, u, v, edge_cost_columns(distance, durations))
+
+    @property
+    def nbytes(self):
+        return self.u.nbytes + self.v.nbytes + self.costs.nbytes
+
+    def csr(self, cost):
+        """
+        Adjacency matrix weighted by one cost, for scipy.sparse.csgraph.
+        """
+        if cost not in self._csr:
+            from scipy.sparse import csr_matrix
+            n = len(self.nodes)
+            data = self.costs[:, COSTS.index(check_cost(cost))].astype(np.float64)
+            self._csr[cost] = csr_matrix((data, (self.u, self.v)), shape=(n, n))
+        return self._csr[cost]
+
+    def _edge_id_matrix(self):
+        if self._edge_ids is None:
+            from scipy.sparse import csr_matrix
+            n, ids = len(self.nodes), np.arange(1, len(self.u) + 1)
+            self._edge_ids = csr_matrix(
+                (np.concatenate([ids, ids]), (np.concatenate([self.u, self.v]), np.concatenate([self.v, self.u]))),
+                shape=(n, n),
+            )
+        return self._edge_ids
+
+    def _accumulate(self, predecessors, cost):
+        """
+        Sum one cost along shortest-path trees given as predecessor rows, by pointer jumping:
+        each pass doubles the path segment every node has summed, so it takes log2(depth) passes.
+        """
+        column = self.costs[:, COSTS.index(cost)].astype(np.float64)
+        has_parent = predecessors >= 0
+        nodes = np.broadcast_to(np.arange(predecessors.shape[1]), predecessors.shape)
+        ancestor = np.where(has_parent, predecessors, nodes)
+        total = np.zeros(predecessors.shape)
+        edge_ids = np.asarray(self._edge_id_matrix()[predecessors[has_parent], nodes[has_parent]]).ravel()
+        total[has_parent] = column[edge_ids - 1]
+        while True:
+            next_ancestor = np.take_along_axis(ancestor, ancestor, axis=1)
+            if np.array_equal(next_ancestor, ancestor):
+                return total
+            total = total + np.take_along_axis(total, ancestor, axis=1)
+            ancestor = next_ancestor
+
+    def matrices(self, sources, targets, costs=COSTS, along=None):
+        """
+        Cost matrices (n_sources x n_targets, float32) for several costs from multi-source csgraph runs.
+        With along=<cost>, a single traversal finds the routes minimizing that cost and every other cost
+        is summed along those same routes; otherwise each cost gets its own optimal routes.
+        Unreachable pairs are inf.
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        costs = [check_cost(cost) for cost in costs]
+        source_idx = np.array([self.index[node] for node in sources], dtype=np.int64)
+        target_idx = np.array([self.index[node] for node in targets], dtype=np.int64)
+        result = {cost: np.empty((len(source_idx), len(target_idx)), dtype=np.float32) for cost in costs}
+
+        for start in range(0, len(source_idx), SOURCE_CHUNK):
+            chunk = source_idx[start:start + SOURCE_CHUNK]
+            rows = slice(start, start + len(chunk))
+            if along is None:
+                for cost in costs:
+                    result[cost][rows] = dijkstra(self.csr(cost), directed=False, indices=chunk)[:, target_idx]
+                continue
+            lengths, predecessors = dijkstra(
+                self.csr(check_cost(along)), directed=False, indices=chunk, return_predecessors=True
+            )
+            unreachable = ~np.isfinite(lengths[:, target_idx])
+            for cost in costs:
+                values = lengths if cost == along else self._accumulate(predecessors, cost)
+                values = values[:, target_idx]
+                values[unreachable] = np.inf
+                result[cost][rows] = values
+        return result
+
+
+def attach_edge_costs(graph):
+    """
+    Build the EdgeCosts of a networkx graph, store it as graph.graph['edge_costs'] and give every
+    edge its row as 'eid'. Call again after changing the graph.
+    """
+    edge_costs = EdgeCosts.from_graph(graph)
+    for eid, (a, b) in enumerate(zip(edge_costs.u, edge_costs.v)):
+        graph.edges[edge_costs.nodes[a], edge_costs.nodes[b]]["eid"] = eid
+    graph.graph["edge_costs"] = edge_costs
+    logger.debug("Edge costs for %d edges, %.1f KiB.", len(edge_costs.u), edge_costs.nbytes / 1024)
+    return edge_costs
+
+
+def get_edge_costs(graph):
+    return graph.graph.get("edge_costs") or attach_edge_costs(graph)
+
+
+def cost_weight(graph, cost):
+    """
+    networkx weight argument for a cost: the plain 'weight' attribute for distance,
+    a lookup into the graph's EdgeCosts array for the travel times.
+    """
+    if check_cost(cost) == "distance":
+        return "weight"
+    costs = get_edge_costs(graph).costs
+    column = COSTS.index(cost)
+    return lambda u, v, data: costs[data["eid"], column]
@@ -1,17 +1,14 @@
 import os
 import logging
-import time
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point, shape
-from pymongo import MongoClient
-from bson.objectid import ObjectId
 from dotenv import load_dotenv
+from mongo_backend import create_client, explode_feature_collection, DistrictResolver, PopulationStore, MapStore, DEFAULT_POPULATION
 from optimization import optimize_outlet_location_fast as optimize_outlet_location
 from visualization import visualize_map
 from osm_utils import load_graph_from_osrm_route
+from metrics import log_payload
 
 # Load environment variables
 load_dotenv()
@@ -26,91 +23,47 @@ CORS(app)  # Enable CORS for cross-origin requests
 
 # Connect to MongoDB
 try:
-    mongo_client = MongoClient(MONGO_URI)
+    mongo_client = create_client(MONGO_URI)
     db = mongo_client["app_data"]  # Corrected database name
     districts_collection = db["districts_geojson"]  # Corrected collection name
+    district_features_collection = db["district_features"]  # One document per district for $geoIntersects
     population_collection = db["district_population"]  # Corrected collection name
-    maps_collection = db["maps"]  # Collection for storing generated maps
     logging.info("Connected to MongoDB successfully.")
 
-    # Create a 2dsphere index on the 'geometry' field
-    districts_collection.create_index([("geometry", "2dsphere")])
-    logging.info("2dsphere index created on 'geometry' field in districts collection.")
+    if district_features_collection.estimated_document_count() == 0:
+        explode_feature_collection(districts_collection, district_features_collection)
+    population_collection.create_index("district")
 
-except Exception as e:
-    logging.error(f"Failed to connect to MongoDB: {e}")
-    raise RuntimeError("Could not connect to MongoDB. Check your MONGO_URI in the .env file.")
-
-# Load districts GeoJSON from MongoDB
-try:
-    districts_data = districts_collection.find_one()
-    if not districts_data or "features" not in districts_data:
-        raise RuntimeError("Districts GeoJSON not found or invalid in MongoDB. Please populate the 'districts_geojson' collection.")
-
-    # Convert GeoJSON to GeoDataFrame
-    districts_gdf = gpd.GeoDataFrame.from_features(districts_data["features"])
-    districts_gdf['geometry'] = districts_gdf['geometry'].apply(shape)  # Ensure Shapely geometries
-    logging.info("Districts GeoJSON loaded successfully.")
-except Exception as e:
-    logging.error(f"Error loading districts GeoJSON: {e}")
-    raise RuntimeError("Failed to load districts GeoJSON from MongoDB.")
+    district_resolver = DistrictResolver(district_features_collection, max_workers=int(os.getenv("MONGO_QUERY_WORKERS", 16)))
+    population_store = PopulationStore(population_collection, ttl=int(os.getenv("POPULATION_CACHE_TTL", 3600)))
+    map_store = MapStore(db, ttl_seconds=int(os.getenv("MAP_TTL_SECONDS", 7 * 24 * 3600)))
 
-# Load population data from MongoDB
-try:
-    population_data = list(population_collection.find())
-    if not population_data:
-        logging.warning("No population data found in MongoDB. Using an empty dataset.")
-        district_population_df = pd.DataFrame(columns=["district", "population"])
-    else:
-        district_population_df = pd.DataFrame(population_data)
-        if not {"district", "population"}.issubset(district_population_df.columns):
-            raise ValueError("Population data is missing required columns ('district', 'population').")
-        district_population_df['district'] = district_population_df['district'].str.strip().str.lower()
-    logging.info("Population data loaded successfully.")
 except Exception as e:
-    logging.error(f"Error loading population data: {e}")
-    raise RuntimeError("Failed to load population data from MongoDB.")
+    logging.error("Failed to connect to MongoDB: %s", e)
+    raise RuntimeError("Could not connect to MongoDB. Check your MONGO_URI in the .env file.")
 
 # Utility functions
-def normalize_name(name):
-    return name.lower().strip() if name else None
-
 def find_district(lat, lon):
     try:
-        point = Point(lon, lat)
-        for _, row in districts_gdf.iterrows():
-            if row['geometry'].contains(point):
-                district_name = row.get('NAME_2', None)
-                if not district_name:
-                    logging.warning(f"No district name found for geometry at ({lat}, {lon})")
-                    return "Unknown"
-                normalized_district = normalize_name(district_name)
-                logging.debug(f"District found for ({lat}, {lon}): {normalized_district}")
-                return normalized_district
-        logging.warning(f"No district found for ({lat}, {lon})")
-        return "Unknown"
+        district = district_resolver.resolve_one(lat, lon)
+        logging.debug("District found for (%s, %s): %s", lat, lon, district)
+        return district
     except Exception as e:
-        logging.error(f"Error finding district: {e}")
+        logging.error("Error finding district: %s", e)
         return "Error"
 
 def get_population_by_district(district_name):
     try:
-        normalized_name = normalize_name(district_name)
-        logging.debug(f"Fetching population for district: {normalized_name}")
-        population_row = district_population_df[district_population_df["district"] == normalized_name]
-        if not population_row.empty:
-            return int(population_row.iloc[0]["population"])
-        logging.warning(f"No population data found for {normalized_name}. Using default.")
-        return 2876546  # Default population
+        return population_store.get(district_name)
     except Exception as e:
-        logging.error(f"Error fetching population for '{district_name}': {e}")
-        return 2876546  # Default value on error
+        logging.error("Error fetching population for '%s': %s", district_name, e)
+        return DEFAULT_POPULATION  # Default value on error
 
 # Routes
 @app.route('/demand-centers', methods=['POST'])
 def demand_centers():
     data = request.json
-    logging.info(f"Received data: {data}")
+    logging.info("Received %d demand centers.", len(data.get('demandCenters', [])) if isinstance(data, dict) else 0)
 
     if not data or 'demandCenters' not in data:
         return jsonify({'error': 'Invalid data: Missing "demandCenters" field'}), 400
@@ -121,21 +74,24 @@ def demand_centers():
             raise ValueError("Invalid demand center data: Missing 'latitude' or 'longitude' fields.")
         demand_centers.rename(columns={'latitude': 'lat', 'longitude': 'lon'}, inplace=True)
 
-        # Assign districts and population
-        demand_centers['district'] = demand_centers.apply(lambda row: find_district(row['lat'], row['lon']), axis=1)
-        demand_centers['population'] = demand_centers.apply(
-            lambda row: get_population_by_district(row['district']) if pd.isna(row.get('population', None)) else row['population'], axis=1
-        )
-        demand_centers['population'] = demand_centers['population'].fillna(2876546)
-        demand_centers.loc[demand_centers['population'] <= 0, 'population'] = 2876546
+        # Assign districts (concurrent server-side queries) and population (one bulk $in query)
+        demand_centers['district'] = district_resolver.resolve(demand_centers['lat'], demand_centers['lon'])
+        populations = population_store.get_many(demand_centers['district'].tolist())
+        district_population = demand_centers['district'].map(populations)
+        if 'population' in demand_centers.columns:
+            demand_centers['population'] = pd.to_numeric(demand_centers['population'], errors='coerce').fillna(district_population)
+        else:
+            demand_centers['population'] = district_population
+        demand_centers['population'] = demand_centers['population'].fillna(DEFAULT_POPULATION)
+        demand_centers.loc[demand_centers['population'] <= 0, 'population'] = DEFAULT_POPULATION
 
-        logging.debug(f"Final demand centers: {demand_centers}")
+        logging.debug("Final demand centers: %d rows", len(demand_centers))
 
         # Determine bounding box for road graph
         min_lat, max_lat = demand_centers['lat'].min(), demand_centers['lat'].max()
         min_lon, max_lon = demand_centers['lon'].min(), demand_centers['lon'].max()
 
-        logging.info(f"Bounding box: ({min_lat}, {min_lon}) to ({max_lat}, {max_lon})")
+        logging.info("Bounding box: (%s, %s) to (%s, %s)", min_lat, min_lon, max_lat, max_lon)
 
         # Load road network
         road_graph = load_graph_from_osrm_route(min_lat, min_lon, max_lat, max_lon)
@@ -151,7 +107,7 @@ def demand_centers():
         initial_outlets = demand_centers.sample(n_outlets, random_state=42).reset_index(drop=True)
         initial_outlets['id'] = range(1, n_outlets + 1)
 
-        logging.debug(f"Initialized outlets: {initial_outlets}")
+        log_payload(logging.getLogger(), logging.DEBUG, "Initialized outlets", initial_outlets)
 
         # Optimize outlets
         logging.info("Optimizing outlet locations...")
@@ -161,8 +117,8 @@ def demand_centers():
         # Generate GeoJSON map
         geojson_data = visualize_map(optimized_outlets, demand_centers, assignments, road_graph)
 
-        # Save map to MongoDB
-        map_id = maps_collection.insert_one({"data": geojson_data, "timestamp": time.time()}).inserted_id
+        # Save map to GridFS (compressed, expires after MAP_TTL_SECONDS)
+        map_id = map_store.put(geojson_data)
 
         return jsonify({
             'message': 'Optimization successful!',
@@ -171,21 +127,20 @@ def demand_centers():
         })
 
     except Exception as e:
-        logging.error(f"Error processing demand centers: {e}")
+        logging.error("Error processing demand centers: %s", e)
         return jsonify({'error': 'Failed to process data'}), 500
 
 @app.route('/download/<map_id>', methods=['GET'])
 def download_file(map_id):
     try:
-        map_data = maps_collection.find_one({"_id": ObjectId(map_id)})
-        if not map_data:
+        geojson_data = map_store.get(map_id)
+        if geojson_data is None:
             return jsonify({'error': 'File not found'}), 404
 
-        geojson_data = map_data['data']
         return jsonify(geojson_data)
 
     except Exception as e:
-        logging.error(f"Error downloading file: {e}")
+        logging.error("Error downloading file: %s", e)
         return jsonify({'error': 'File not found'}), 404
 
 if __name__ == '__main__':
@@ -0,0 +1,205 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "parquet", "ndjson")
+COLUMN_ALIASES = {
+    "latitude": "lat",
+    "longitude": "lon",
+    "lng": "lon",
+    "long": "lon",
+    "pop": "population",
+}
+KNOWN_COLUMNS = {"id", "lat", "lon", "population"}
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def canonical_column(name):
+    name = str(name).strip().lower()
+    return COLUMN_ALIASES.get(name, name)
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    """
+    Resolve the upload format from an explicit value, the file extension or the content type.
+    """
+    if explicit:
+        fmt = explicit.lower()
+        if fmt not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported format '{explicit}'. Use one of {', '.join(SUPPORTED_FORMATS)}.")
+        return fmt
+    if filename:
+        fmt = EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+        if fmt:
+            return fmt
+    if content_type:
+        fmt = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    raise ValueError("Could not determine upload format. Pass ?format=csv|parquet|ndjson.")
+
+
+class ColumnarBuffer:
+    """
+    Growable NumPy column arrays for demand centers, filled chunk by chunk.
+    Ids stay float64 (NaN where not supplied) until assign_ids runs on the complete upload.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {
+            "id": np.empty(capacity, dtype=np.float64),
+            "lat": np.empty(capacity, dtype=np.float64),
+            "lon": np.empty(capacity, dtype=np.float64),
+            "population": np.empty(capacity, dtype=np.float64),
+        }
+
+    def _reserve(self, extra):
+        capacity = len(self.columns["id"])
+        needed = self.size + extra
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, array in self.columns.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.columns[name] = grown
+
+    def append(self, chunk):
+        n = len(chunk["lat"])
+        self._reserve(n)
+        for name, array in self.columns.items():
+            array[self.size:self.size + n] = chunk[name]
+        self.size += n
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: array[:self.size] for name, array in self.columns.items()})
+
+
+def coerce_chunk(chunk):
+    """
+    Validate and coerce one chunk of raw rows into typed columns.
+    Rows with missing or out-of-range coordinates are dropped; missing ids are left as NaN.
+    Returns (columns, dropped_row_count).
+    """
+    import pandas as pd
+
+    chunk = chunk.rename(columns=canonical_column)
+    if "lat" not in chunk.columns or "lon" not in chunk.columns:
+        raise ValueError("Invalid demand center data: Missing 'latitude' or 'longitude' fields.")
+
+    lat = pd.to_numeric(chunk["lat"], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(chunk["lon"], errors="coerce").to_numpy(dtype=np.float64)
+    valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    if "population" in chunk.columns:
+        population = pd.to_numeric(chunk["population"], errors="coerce").to_numpy(dtype=np.float64)
+    else:
+        population = np.full(len(chunk), np.nan)
+
+    if "id" in chunk.columns:
+        ids = pd.to_numeric(chunk["id"], errors="coerce").to_numpy(dtype=np.float64)
+        ids[~np.isfinite(ids)] = np.nan
+    else:
+        ids = np.full(len(chunk), np.nan)
+
+    columns = {"id": ids[valid], "lat": lat[valid], "lon": lon[valid], "population": population[valid]}
+    return columns, int((~valid).sum())
+
+
+def assign_ids(ids):
+    """
+    Integer ids for a complete upload: supplied ids are kept and must be unique,
+    missing ones are numbered on from the largest supplied id.
+    """
+    missing = np.isnan(ids)
+    supplied = ids[~missing].astype(np.int64)
+    values, counts = np.unique(supplied, return_counts=True)
+    duplicates = values[counts > 1]
+    if len(duplicates):
+        shown = ", ".join(str(v) for v in duplicates[:10])
+        raise ValueError(f"Invalid demand center data: duplicate ids {shown}{' ...' if len(duplicates) > 10 else ''}.")
+
+    start = int(supplied.max()) + 1 if len(supplied) else 1
+    result = np.empty(len(ids), dtype=np.int64)
+    result[~missing] = supplied
+    result[missing] = np.arange(start, start + int(missing.sum()))
+    return result
+
+
+def _seekable(stream):
+    """
+    Parquet needs random access, so spool non-seekable request streams to a temporary file.
+    """
+    try:
+        if stream.seekable():
+            return stream
+    except AttributeError:
+        pass
+    spooled = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+    shutil.copyfileobj(stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_chunks(stream, fmt, chunksize=100_000):
+    """
+    Yield raw DataFrame chunks from a CSV, Parquet or NDJSON byte stream.
+    Only the known demand center columns are materialized.
+    """
+    import pandas as pd
+
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream)
+    if fmt == "csv":
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        yield from pd.read_csv(text, chunksize=chunksize, usecols=lambda c: canonical_column(c) in KNOWN_COLUMNS)
+    elif fmt == "ndjson":
+        text = io.TextIOWrapper(stream, encoding="utf-8")
+        for chunk in pd.read_json(text, lines=True, chunksize=chunksize):
+            yield chunk[[c for c in chunk.columns if canonical_column(c) in KNOWN_COLUMNS]]
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(_seekable(stream))
+        columns = [c for c in parquet_file.schema_arrow.names if canonical_column(c) in KNOWN_COLUMNS]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'.")
+
+
+def read_demand_centers(stream, fmt, chunksize=100_000):
+    """
+    Stream demand centers from an uploaded file into columnar arrays.
+    Returns a DataFrame with id, lat, lon and population (NaN where not supplied).
+    Raises ValueError when supplied ids repeat.
+    """
+    buffer = ColumnarBuffer()
+    dropped = 0
+    for chunk in iter_chunks(stream, fmt, chunksize=chunksize):
+        columns, chunk_dropped = coerce_chunk(chunk)
+        buffer.append(columns)
+        dropped += chunk_dropped
+    if dropped:
+        logger.warning("Dropped %d demand centers with missing or invalid coordinates.", dropped)
+    logger.info("Ingested %d demand centers from %s upload.", buffer.size, fmt)
+    demand_centers = buffer.to_frame()
+    demand_centers["id"] = assign_ids(demand_centers["id"].to_numpy())
+    return demand_centers
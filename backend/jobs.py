@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import stage_listener
+from serializers import encode_json
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))  # How long finished jobs stay queryable
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # Jobs running at once; later submissions wait in the pool's queue
+HEARTBEAT_SECONDS = 15
+# Stages reported to clients; finer spans (snapping, per-iteration timings) would flood the stream
+PROGRESS_STAGES = (
+    "district_lookup", "population_join", "graph_load", "distance_matrix",
+    "optimization", "catchments", "map_generation", "result_tables",
+)
+
+
+class Job:
+    """
+    One pipeline run on the registry's thread pool. Events are appended in order and numbered from 1,
+    so a reconnecting client can resume with Last-Event-ID.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"
+        self.events = []
+        self.result = None  # (body bytes, status code, mimetype) once finished
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    def emit(self, event, data):
+        with self._changed:
+            self.events.append((len(self.events) + 1, event, data))
+            self._changed.notify_all()
+
+    def finish(self, status, result):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.finished_at = time.time()
+            self.events.append((len(self.events) + 1, status, {"status": status}))
+            self._changed.notify_all()
+
+    def stream(self, last_event_id=0, heartbeat=HEARTBEAT_SECONDS):
+        """
+        Server-sent events from last_event_id on, ending after the final 'done' or 'failed' event.
+        """
+        position = last_event_id
+        while True:
+            with self._changed:
+                if position >= len(self.events) and self.finished_at is None:
+                    self._changed.wait(heartbeat)
+                pending = self.events[position:]
+                finished = self.finished_at is not None
+            if not pending:
+                if finished:
+                    return
+                yield b": heartbeat\n\n"
+                continue
+            for event_id, event, data in pending:
+                yield f"id: {event_id}\nevent: {event}\n".encode() + b"data: " + encode_json(data) + b"\n\n"
+            position = pending[-1][0]
+
+
+class JobRegistry:
+    """
+    In-memory job registry. Jobs live in the worker process that started them, so the API
+    must run as a single (threaded) worker for the events and result URLs to resolve.
+    on_evict(job) is called for each expired job, e.g. to delete the files it wrote.
+    """
+
+    def __init__(self, ttl=JOB_TTL_SECONDS, max_workers=JOB_WORKERS, on_evict=None):
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def get(self, job_id):
+        self.purge_expired()
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [j for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            if self.on_evict is None:
+                continue
+            try:
+                self.on_evict(job)
+            except Exception as e:
+                logger.warning("Cleanup of job %s failed: %s", job.id, e)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, progress=job.emit, run_id=job.id, **kwargs) on the thread pool.
+        fn returns a Flask response, whose body becomes the job result. Finished spans are reported as
+        'stage' events, and each solver iteration's outlets and assignments as a 'partial_assignments' event.
+        """
+        self.purge_expired()
+        job = Job(uuid.uuid4().hex[:12])
+        with self._lock:
+            self.jobs[job.id] = job
+
+        def on_stage(stage, seconds, info):
+            if stage in PROGRESS_STAGES:
+                job.emit("stage", {"stage": stage, "seconds": round(seconds, 3)})
+            elif stage == "optimization_iteration" and "assignments" in info:
+                job.emit("partial_assignments", {
+                    "iteration": info["iteration"],
+                    "outlets": info["outlets"].to_dict(orient="records"),
+                    "assignments": info["assignments"].to_dict(orient="records"),
+                })
+
+        def run():
+            job.status = "running"
+            try:
+                with stage_listener(on_stage):
+                    response = fn(*args, progress=job.emit, run_id=job.id, **kwargs)
+                status = "done" if response.status_code < 400 else "failed"
+                job.finish(status, (response.get_data(), response.status_code, response.mimetype))
+            except Exception as e:
+                logger.error("Job %s failed: %s", job.id, e)
+                job.finish("failed", (encode_json({"error": "Failed to process data"}), 500, "application/json"))
+
+        self._executor.submit(run)
+        return job
@@ -1,6 +1,7 @@
-from input_handler import process_inputs
-from optimization import optimize_outlet_location
+import os
+from optimization import optimize_outlet_location_fast
 from visualization import visualize_map
+from osm_utils import load_graph_from_osrm_route
 from sklearn.cluster import KMeans
 import pandas as pd
 
@@ -49,11 +50,14 @@ outlets_df = pd.DataFrame({
     'population': [1] * n_outlets  # Default population for now, you can adjust this based on demand centers' clusters
 })
 
-# Perform optimization
-optimal_outlets = optimize_outlet_location(outlets_df, demand_centers_df)
+# Load the road network for the demand centers' bounding box
+road_graph = load_graph_from_osrm_route(
+    demand_centers_df['lat'].min(), demand_centers_df['lon'].min(),
+    demand_centers_df['lat'].max(), demand_centers_df['lon'].max(),
+)
 
-# Create assignments DataFrame
-assignments = optimal_outlets[['demand_id', 'outlet_id']]
+# Perform optimization
+assignments, optimized_outlets = optimize_outlet_location_fast(outlets_df, demand_centers_df, road_graph)
 
 # Group demand centers by outlet and display in the desired format
 outlet_assignments = {outlet_id: [] for outlet_id in outlets_df['id']}
@@ -71,4 +75,5 @@ for outlet_id, demand_ids in outlet_assignments.items():
     print()  # Add a newline for better readability
 
 # Visualize the results with connections
-visualize_map(outlets_df, demand_centers_df, assignments)
+visualize_map(optimized_outlets, demand_centers_df, assignments, road_graph,
+              map_file_path=os.path.join("maps", "optimized_retail_map_with_connections.geojson"))
@@ -0,0 +1,212 @@
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_LOG_SAMPLE_RATE = float(os.getenv("PAYLOAD_LOG_SAMPLE_RATE", "0.01"))
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with optional labels.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "outlet_planner_stage_seconds", "Time spent in each pipeline stage.", labelnames=("stage",)
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "outlet_planner_requests_total", "Pipeline requests by endpoint and outcome.", labelnames=("endpoint", "outcome")
+))
+OSRM_REQUESTS = REGISTRY.register(Counter(
+    "outlet_planner_osrm_requests_total", "OSRM route requests by outcome.", labelnames=("outcome",)
+))
+OSRM_SECONDS = REGISTRY.register(Histogram(
+    "outlet_planner_osrm_request_seconds", "OSRM route request latency."
+))
+CACHE_EVENTS = REGISTRY.register(Counter(
+    "outlet_planner_cache_events_total", "Cache lookups by cache and result.", labelnames=("cache", "result")
+))
+MATRIX_CELLS = REGISTRY.register(Histogram(
+    "outlet_planner_distance_matrix_cells", "Outlet x demand center pairs per distance matrix.",
+    buckets=(10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+))
+OPTIMIZATION_ITERATIONS = REGISTRY.register(Histogram(
+    "outlet_planner_optimization_iterations", "Solver iterations per optimization run.",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+))
+
+
+_STAGE_LISTENER = contextvars.ContextVar("stage_listener", default=None)
+
+
+@contextmanager
+def stage_listener(callback):
+    """
+    Call callback(stage, seconds, info) whenever a span finishes in the current context (e.g. a job's thread).
+    info is the dict the span yielded, holding whatever the timed code left in it.
+    """
+    token = _STAGE_LISTENER.set(callback)
+    try:
+        yield
+    finally:
+        _STAGE_LISTENER.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a pipeline stage and record it in the stage histogram.
+    Yields a dict the timed code can fill with intermediate results for stage listeners.
+    """
+    info = {}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Stage %s took %.3f s", stage, elapsed)
+        listener = _STAGE_LISTENER.get()
+        if listener is not None:
+            listener(stage, elapsed, info)
+
+
+def summarize(payload):
+    """
+    Short description of a payload: shape and columns for tables, length for sequences.
+    """
+    shape = getattr(payload, "shape", None)
+    if shape is not None:
+        columns = getattr(payload, "columns", None)
+        return f"{type(payload).__name__}{tuple(shape)}" + (f" columns={list(columns)}" if columns is not None else "")
+    if isinstance(payload, (list, tuple, dict, set)):
+        return f"{type(payload).__name__}(len={len(payload)})"
+    return repr(payload)[:200]
+
+
+def log_payload(log, level, message, payload, sample_rate=None):
+    """
+    Log a large payload lazily and only for a sample of calls.
+    Nothing is formatted when the level is disabled or the call is not sampled;
+    sampled calls log a summary, and the full payload only at DEBUG with a sample rate of 1.
+    """
+    if not log.isEnabledFor(level):
+        return
+    rate = PAYLOAD_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+    if level <= logging.DEBUG and rate >= 1:
+        log.log(level, "%s: %s", message, payload)
+    else:
+        log.log(level, "%s: %s", message, summarize(payload))
@@ -0,0 +1,192 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POPULATION = 2876546
+
+
+def create_client(uri=None, **overrides):
+    """
+    Create a pooled MongoClient tuned for many short concurrent queries.
+    Set MONGO_MOCK=1 to use an in-memory mongomock client instead of a real server. mongomock does not
+    implement $geoIntersects, so district lookups (DistrictResolver) still need a real server.
+    """
+    if os.getenv("MONGO_MOCK") == "1":
+        import mongomock
+        import mongomock.gridfs
+        mongomock.gridfs.enable_gridfs_integration()
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 4)),
+        "maxIdleTimeMS": 60_000,
+        "waitQueueTimeoutMS": 5_000,
+        "connectTimeoutMS": 5_000,
+        "serverSelectionTimeoutMS": 5_000,
+        "retryReads": True,
+        "compressors": "zlib",
+        "appname": "GeoOutletPlanner",
+    }
+    options.update(overrides)
+    return MongoClient(uri, **options)
+
+
+def normalize_name(name):
+    return name.lower().strip() if name else None
+
+
+def explode_feature_collection(source_collection, target_collection):
+    """
+    Migrate the single FeatureCollection document into one document per district,
+    which is what $geoIntersects needs to use the 2dsphere index.
+    """
+    from pymongo import GEOSPHERE
+
+    collection_doc = source_collection.find_one({"features": {"$exists": True}})
+    if not collection_doc:
+        raise RuntimeError("Districts GeoJSON not found or invalid in MongoDB. Please populate the 'districts_geojson' collection.")
+
+    documents = []
+    for feature in collection_doc["features"]:
+        properties = feature.get("properties") or {}
+        documents.append({
+            "name": properties.get("NAME_2"),
+            "district": normalize_name(properties.get("NAME_2")),
+            "geometry": feature["geometry"],
+        })
+    target_collection.delete_many({})
+    if documents:
+        target_collection.insert_many(documents, ordered=False)
+    target_collection.create_index([("geometry", GEOSPHERE)])
+    logger.info("Migrated %d districts into '%s'.", len(documents), target_collection.name)
+    return len(documents)
+
+
+def point_query(lat, lon):
+    """
+    Filter matching the district documents whose geometry contains (lat, lon); GeoJSON puts lon first.
+    """
+    return {"geometry": {"$geoIntersects": {"$geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]}}}}
+
+
+class DistrictResolver:
+    """
+    Resolve districts for a batch of points with concurrent $geoIntersects queries on the server.
+    """
+
+    def __init__(self, collection, max_workers=16, precision=5):
+        self.collection = collection
+        self.max_workers = max_workers
+        self.precision = precision  # Points are deduplicated after rounding to this many decimals
+
+    def resolve_one(self, lat, lon):
+        doc = self.collection.find_one(point_query(lat, lon), projection={"district": 1, "_id": 0})
+        if not doc or not doc.get("district"):
+            logger.warning("No district found for (%s, %s)", lat, lon)
+            return "Unknown"
+        return doc["district"]
+
+    def resolve(self, lats, lons):
+        keys = [(round(float(lat), self.precision), round(float(lon), self.precision)) for lat, lon in zip(lats, lons)]
+        unique = list(dict.fromkeys(keys))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(unique), 1))) as executor:
+            results = dict(zip(unique, executor.map(lambda key: self.resolve_one(*key), unique)))
+        return [results[key] for key in keys]
+
+
+class PopulationStore:
+    """
+    District population lookups with a local TTL cache in front of one $in query per batch.
+    """
+
+    def __init__(self, collection, ttl=3600, maxsize=20_000):
+        self.collection = collection
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def get_many(self, district_names, default=DEFAULT_POPULATION):
+        names = {normalize_name(name) for name in district_names if name}
+        with self.lock:
+            missing = [name for name in names if name not in self.cache]
+        if missing:
+            found = {
+                doc["district"]: doc["population"]
+                for doc in self.collection.find({"district": {"$in": missing}}, {"district": 1, "population": 1, "_id": 0})
+            }
+            with self.lock:
+                for name in missing:
+                    self.cache[name] = found.get(name)  # Cache misses too, so unknown names are not re-queried
+        with self.lock:
+            lookup = {name: self.cache.get(name) for name in names}
+        result = {}
+        for name in district_names:
+            population = lookup.get(normalize_name(name)) if name else None
+            result[name] = int(population) if population is not None else default
+        return result
+
+    def get(self, district_name, default=DEFAULT_POPULATION):
+        return self.get_many([district_name], default=default)[district_name]
+
+
+class MapStore:
+    """
+    Generated maps stored gzip-compressed in GridFS and expired after a TTL.
+    """
+
+    def __init__(self, db, bucket_name="maps", ttl_seconds=7 * 24 * 3600, grace_seconds=24 * 3600):
+        import gridfs
+
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self.ttl_seconds = ttl_seconds
+        try:
+            # Safety net only: purge_expired normally removes files together with their chunks first
+            self.files.create_index("metadata.expireAt", expireAfterSeconds=grace_seconds)
+        except Exception as e:
+            logger.warning("Could not create TTL index on '%s': %s", self.files.name, e)
+
+    def put(self, geojson_data):
+        from datetime import datetime, timedelta, timezone
+
+        self.purge_expired()
+        payload = gzip.compress(json.dumps(geojson_data, default=_json_default).encode("utf-8"))
+        expire_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        file_id = self.bucket.upload_from_stream(
+            "map.geojson.gz", payload,
+            metadata={"contentType": "application/geo+json", "encoding": "gzip", "expireAt": expire_at, "created": time.time()},
+        )
+        return str(file_id)
+
+    def get(self, map_id):
+        from bson.objectid import ObjectId
+        import gridfs
+
+        try:
+            stream = self.bucket.open_download_stream(ObjectId(map_id))
+        except gridfs.errors.NoFile:
+            return None
+        return json.loads(gzip.decompress(stream.read()))
+
+    def purge_expired(self):
+        from datetime import datetime, timezone
+
+        expired = self.files.find({"metadata.expireAt": {"$lt": datetime.now(timezone.utc)}}, {"_id": 1})
+        for doc in expired:
+            self.bucket.delete(doc["_id"])
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -1,46 +1,120 @@
-import pandas as pd
 import numpy as np
+import os
 import logging  # Fix for undefined logging
 from osm_utils import calculate_road_distance, find_nearest_node
+from metrics import span, MATRIX_CELLS, OPTIMIZATION_ITERATIONS
+from sparse_distances import SparseDistances, build_sparse_distances, snap_to_nodes, DEFAULT_K
+from edge_costs import COSTS, get_edge_costs, straight_line_cost
 
-def precompute_distances(outlets, demand_centers, road_graph):
+# Above this many outlet x demand pairs, only the k nearest candidates per demand center are stored
+SPARSE_MIN_CELLS = int(os.getenv("SPARSE_DISTANCE_MIN_CELLS", "1000000"))
+EARTH_RADIUS_KM = 6371
+
+def precompute_distances(outlets, demand_centers, road_graph, cost="distance"):
     """
     Precompute distances between all outlets and demand centers using OSRM.
     Optimized with caching and vectorized calculations.
+    cost selects the edge cost; the 'distance' column then holds that cost (minutes for travel times).
     """
+    import pandas as pd
+
+    MATRIX_CELLS.observe(len(outlets) * len(demand_centers))
     distances = []
-    for _, outlet in outlets.iterrows():
-        for _, demand in demand_centers.iterrows():
-            distance = calculate_road_distance(
-                road_graph, outlet['lat'], outlet['lon'], demand['lat'], demand['lon']
-            )
-            distances.append((outlet['id'], demand['id'], distance))
+    with span('distance_matrix'):
+        # Snap every point once rather than twice per pair
+        with span('snapping'):
+            outlet_nodes = [find_nearest_node(road_graph, lat, lon) for lat, lon in zip(outlets['lat'], outlets['lon'])]
+            demand_nodes = [
+                find_nearest_node(road_graph, lat, lon) for lat, lon in zip(demand_centers['lat'], demand_centers['lon'])
+            ]
+        for (_, outlet), outlet_node in zip(outlets.iterrows(), outlet_nodes):
+            for (_, demand), demand_node in zip(demand_centers.iterrows(), demand_nodes):
+                distance = calculate_road_distance(
+                    road_graph, outlet['lat'], outlet['lon'], demand['lat'], demand['lon'], cost=cost,
+                    node1=outlet_node, node2=demand_node,
+                )
+                distances.append((outlet['id'], demand['id'], distance))
     return pd.DataFrame(distances, columns=['outlet_id', 'demand_id', 'distance'])
 
 
-def vectorized_gravity_model(outlets, demand_centers):
+def build_distances(outlets, demand_centers, road_graph, k=None, cost="distance"):
     """
-    Vectorized calculation of distances and interactions using NumPy and pandas.
+    Full long-form distance table for small problems, SparseDistances with the k nearest
+    candidates per demand center when k is given or the full matrix would exceed SPARSE_MIN_CELLS.
+    """
+    if k is None and len(outlets) * len(demand_centers) <= SPARSE_MIN_CELLS:
+        return precompute_distances(outlets, demand_centers, road_graph, cost=cost)
+    return build_sparse_distances(outlets, demand_centers, road_graph, k=k or DEFAULT_K, cost=cost)
+
+
+def precompute_cost_tables(outlets, demand_centers, road_graph, costs=COSTS, along=None):
+    """
+    Long-form tables for several costs at once, keyed by cost. Every outlet is a source of one
+    multi-source graph traversal per cost (or a single traversal with along=<cost>, summing the other
+    costs over the routes that minimize it), instead of one shortest-path search per pair and cost.
+    """
+    import pandas as pd
+
+    MATRIX_CELLS.observe(len(outlets) * len(demand_centers))
+    with span('distance_matrix'):
+        with span('snapping'):
+            outlet_nodes = snap_to_nodes(road_graph, outlets['lat'].to_numpy(float), outlets['lon'].to_numpy(float))
+            demand_nodes = snap_to_nodes(road_graph, demand_centers['lat'].to_numpy(float), demand_centers['lon'].to_numpy(float))
+        matrices = get_edge_costs(road_graph).matrices(outlet_nodes, demand_nodes, costs=costs, along=along)
+
+        straight = haversine_matrix(outlets, demand_centers)
+        tables = {}
+        for cost, matrix in matrices.items():
+            unreachable = ~np.isfinite(matrix)
+            if unreachable.any():
+                matrix = matrix.copy()
+                matrix[unreachable] = [straight_line_cost(km, cost) for km in straight[unreachable]]
+            tables[cost] = pd.DataFrame({
+                'outlet_id': outlets['id'].to_numpy().repeat(len(demand_centers)),
+                'demand_id': np.tile(demand_centers['id'].to_numpy(), len(outlets)),
+                'distance': matrix.ravel(),
+            })
+    return tables
+
+
+def restrict_distances(distances, outlet_ids):
+    """
+    Distances limited to the given outlets, for either representation.
     """
-    # Convert coordinates to radians
-    outlet_coords = np.radians(outlets[['lat', 'lon']].to_numpy())
-    demand_coords = np.radians(demand_centers[['lat', 'lon']].to_numpy())
+    if isinstance(distances, SparseDistances):
+        return distances.restrict(outlet_ids)
+    return distances[distances['outlet_id'].isin(outlet_ids)]
 
-    # Expand for broadcasting
+
+def haversine_matrix(outlets, demand_centers):
+    """
+    Great-circle distances in km, shape (n_outlets, n_demand_centers).
+    """
+    outlet_coords = np.radians(outlets[['lat', 'lon']].to_numpy(dtype=float))
+    demand_coords = np.radians(demand_centers[['lat', 'lon']].to_numpy(dtype=float))
+
+    # Outlets along rows, demand centers along columns
     lat1, lon1 = outlet_coords[:, 0:1], outlet_coords[:, 1:2]
-    lat2, lon2 = demand_coords[:, 0:1], demand_coords[:, 1:2].T
+    lat2, lon2 = demand_coords[:, 0:1].T, demand_coords[:, 1:2].T
     dlat, dlon = lat2 - lat1, lon2 - lon1
 
-    # Haversine formula for distances
     a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
     c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    distances = 6371 * c  # Earth radius in km
+    return EARTH_RADIUS_KM * c
+
+
+def vectorized_gravity_model(outlets, demand_centers):
+    """
+    Vectorized calculation of distances and interactions using NumPy and pandas.
+    """
+    distances = haversine_matrix(outlets, demand_centers)
 
     # Gravity model interactions
     outlet_pop = outlets['population'].to_numpy()[:, None]  # Shape (n_outlets, 1)
     demand_pop = demand_centers['population'].to_numpy()[None, :]  # Shape (1, n_demand_centers)
-    interactions = (outlet_pop * demand_pop) / (distances ** 2)
-    interactions[np.isnan(interactions)] = 0  # Avoid NaNs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interactions = (outlet_pop * demand_pop) / (distances ** 2)
+    interactions[~np.isfinite(interactions)] = 0  # Co-located pairs, like gravity_model's zero-distance case
 
     return distances, interactions
 
@@ -48,52 +122,79 @@ def vectorized_gravity_model(outlets, demand_centers):
 def assign_demand_to_outlets_fast(distances, demand_centers):
     """
     Assign demand centers to the nearest outlet based on precomputed distances.
-    Ensures all demand centers are assigned.
+    Ensures all demand centers are assigned. Accepts a long-form table or SparseDistances.
     """
-    min_distances = distances.loc[distances.groupby('demand_id')['distance'].idxmin()]
+    if isinstance(distances, SparseDistances):
+        min_distances = distances.nearest()
+    else:
+        min_distances = distances.loc[distances.groupby('demand_id')['distance'].idxmin()]
     unassigned = demand_centers[~demand_centers['id'].isin(min_distances['demand_id'])]
 
     if not unassigned.empty:
-        logging.warning(f"Unassigned demand centers: {len(unassigned)}")
+        logging.warning("Unassigned demand centers: %d", len(unassigned))
         for _, row in unassigned.iterrows():
-            logging.warning(f"Demand center {row['id']} could not be assigned to an outlet.")
+            logging.warning("Demand center %s could not be assigned to an outlet.", row['id'])
 
     return min_distances
 
 
-def optimize_outlet_location_fast(outlets, demand_centers, road_graph):
+def build_distances_by_cost(outlets, demand_centers, road_graph, costs, along=None):
+    """
+    One distance table per cost. Small problems share the multi-cost traversal of precompute_cost_tables,
+    a single traversal along the routes minimizing one cost when along is given;
+    larger ones get a SparseDistances per cost (each on its own optimal routes).
+    """
+    costs = list(dict.fromkeys(costs))
+    if len(outlets) * len(demand_centers) <= SPARSE_MIN_CELLS:
+        return precompute_cost_tables(outlets, demand_centers, road_graph, costs=costs, along=along)
+    return {cost: build_sparse_distances(outlets, demand_centers, road_graph, cost=cost) for cost in costs}
+
+
+def optimize_outlet_location_fast(outlets, demand_centers, road_graph, distances=None, cost="distance", min_outlets=1):
     """
     Optimized version of outlet location optimization using vectorized calculations.
+    Pass distances (long-form or SparseDistances, covering at least these outlets) to reuse a shared matrix.
+    cost selects the edge cost (see edge_costs.COSTS) used when the matrix is built here.
+    Outlets are dropped while every demand center stays assigned, but never below min_outlets.
     """
-    # Precompute distances
-    distances = precompute_distances(outlets, demand_centers, road_graph)
+    # Precompute distances once; outlet subsets below are evaluated by restricting this table
+    if distances is None:
+        distances = build_distances(outlets, demand_centers, road_graph, cost=cost)
+    distances = restrict_distances(distances, outlets['id'])
 
     # Assign demand to outlets
     assignments = assign_demand_to_outlets_fast(distances, demand_centers)
 
     # Optimization loop with logging and stagnation detection
     max_iterations = 10  # Limit the number of iterations
+    iterations = 0
     for iteration in range(max_iterations):
-        logging.info(f"Iteration {iteration + 1}: {len(outlets)} outlets remaining.")
+        if len(outlets) <= min_outlets:
+            break
+        logging.info("Iteration %d: %d outlets remaining.", iteration + 1, len(outlets))
+        iterations += 1
 
         outlet_dropped = False  # Track if any outlet was dropped
-        for i, outlet in outlets.iterrows():
-            # Test removing one outlet
-            test_outlets = outlets.drop(i)
-            test_distances = precompute_distances(test_outlets, demand_centers, road_graph)
-            test_assignments = assign_demand_to_outlets_fast(test_distances, demand_centers)
-
-            # If successful, update outlets and assignments
-            if len(test_assignments) == len(demand_centers):
-                outlets = test_outlets
-                assignments = test_assignments
-                outlet_dropped = True
-                logging.info(f"Outlet {outlet['id']} removed.")
-                break
+        with span('optimization_iteration') as info:
+            for i, outlet in outlets.iterrows():
+                # Test removing one outlet
+                test_outlets = outlets.drop(i)
+                test_distances = restrict_distances(distances, test_outlets['id'])
+                test_assignments = assign_demand_to_outlets_fast(test_distances, demand_centers)
+
+                # If successful, update outlets and assignments
+                if len(test_assignments) == len(demand_centers):
+                    outlets = test_outlets
+                    assignments = test_assignments
+                    outlet_dropped = True
+                    logging.info("Outlet %s removed.", outlet['id'])
+                    break
+            info.update(iteration=iterations, outlets=outlets, assignments=assignments)
 
         if not outlet_dropped:  # No outlets could be removed, stop early
             logging.warning("No outlets could be removed. Stopping optimization.")
             break
+    OPTIMIZATION_ITERATIONS.observe(iterations)
 
     # Update outlet locations
     optimized_outlets = update_outlet_locations(assignments, demand_centers, outlets)
@@ -104,6 +205,8 @@ def update_outlet_locations(assignments, demand_centers, outlets):
     """
     Update outlet locations to the weighted mean of their assigned demand centers.
     """
+    import pandas as pd
+
     optimized_outlets = []
 
     for outlet_id, group in assignments.groupby('outlet_id'):
@@ -118,3 +221,112 @@ def update_outlet_locations(assignments, demand_centers, outlets):
         optimized_outlets.append({'id': outlet_id, 'lat': lat, 'lon': lon, 'population': 1})
 
     return pd.DataFrame(optimized_outlets)
+
+
+
+def build_coverage_matrix(candidates, demand_centers, radius_km):
+    """
+    Build the candidate -> demand coverage relation within radius_km.
+    Uses a haversine BallTree so only nearby pairs are ever evaluated, and stores
+    the result as a packed bitset of shape (n_candidates, ceil(n_demand / 8)).
+    """
+    from sklearn.neighbors import BallTree  # Deferred: sklearn is only needed by the coverage solver
+
+    demand_coords = np.radians(demand_centers[['lat', 'lon']].to_numpy(dtype=float))
+    candidate_coords = np.radians(candidates[['lat', 'lon']].to_numpy(dtype=float))
+
+    tree = BallTree(demand_coords, metric='haversine')
+    neighbours = tree.query_radius(candidate_coords, r=radius_km / EARTH_RADIUS_KM)
+
+    n_demand = len(demand_centers)
+    n_bytes = (n_demand + 7) // 8
+    coverage = np.zeros((len(candidates), n_bytes), dtype=np.uint8)
+    for i, demand_idx in enumerate(neighbours):
+        if len(demand_idx) == 0:
+            continue
+        # Set bit demand_idx in row i, MSB-first to match np.packbits / np.unpackbits
+        np.bitwise_or.at(coverage[i], demand_idx >> 3, (0x80 >> (demand_idx & 7)).astype(np.uint8))
+    return coverage
+
+
+def weighted_popcount(bitsets, weights, chunk_size=64):
+    """
+    Population-weighted popcount of each packed bitset row.
+    Rows are unpacked in chunks so memory stays bounded for thousands of candidates.
+    """
+    n = len(weights)
+    result = np.empty(len(bitsets), dtype=np.float64)
+    for start in range(0, len(bitsets), chunk_size):
+        block = np.unpackbits(bitsets[start:start + chunk_size], axis=1, count=n)
+        result[start:start + chunk_size] = block @ weights
+    return result
+
+
+def optimize_maximal_coverage(candidates, demand_centers, n_outlets, radius_km, max_swap_iterations=10):
+    """
+    Maximal covering location: choose n_outlets candidates maximizing the population
+    within radius_km. A greedy start is refined by single-swap improvements.
+    Returns (assignments, selected_outlets) like optimize_outlet_location_fast.
+    """
+    import pandas as pd
+
+    candidates = candidates.reset_index(drop=True)
+    demand_centers = demand_centers.reset_index(drop=True)
+    n_outlets = min(n_outlets, len(candidates))
+    weights = demand_centers['population'].to_numpy(dtype=np.float64)
+    coverage = build_coverage_matrix(candidates, demand_centers, radius_km)
+
+    # Greedy: repeatedly take the candidate covering the most uncovered population
+    selected = []
+    covered = np.zeros(coverage.shape[1], dtype=np.uint8)
+    for _ in range(n_outlets):
+        gains = weighted_popcount(coverage & ~covered, weights)
+        gains[selected] = -1
+        best = int(np.argmax(gains))
+        selected.append(best)
+        covered |= coverage[best]
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info("Greedy coverage: %.0f population.", weighted_popcount(covered[None, :], weights)[0])
+
+    # Swap improvement: replace one selected candidate if another one covers more population
+    for iteration in range(max_swap_iterations):
+        improved = False
+        for position, current in enumerate(selected):
+            others = [c for c in selected if c != current]
+            covered_without = np.zeros_like(covered)
+            for c in others:
+                covered_without |= coverage[c]
+            loss = weighted_popcount((coverage[current] & ~covered_without)[None, :], weights)[0]
+            gains = weighted_popcount(coverage & ~covered_without, weights)
+            gains[selected] = -1
+            best = int(np.argmax(gains))
+            if gains[best] > loss + 1e-9:
+                logging.info("Swap iteration %d: candidate %d -> %d (+%.0f).", iteration + 1, current, best, gains[best] - loss)
+                selected[position] = best
+                covered = covered_without | coverage[best]
+                improved = True
+        if not improved:
+            break
+
+    selected_outlets = candidates.iloc[selected].reset_index(drop=True)
+    if 'id' not in selected_outlets.columns:
+        selected_outlets['id'] = range(1, len(selected_outlets) + 1)
+
+    # Assign each covered demand center to its nearest selected outlet
+    distances = haversine_matrix(selected_outlets, demand_centers)
+    covered_mask = np.unpackbits(coverage[selected], axis=1, count=len(demand_centers)).astype(bool)
+    distances = np.where(covered_mask, distances, np.inf)
+    nearest = distances.argmin(axis=0)
+    nearest_distance = distances[nearest, np.arange(len(demand_centers))]
+    is_covered = np.isfinite(nearest_distance)
+
+    assignments = pd.DataFrame({
+        'outlet_id': selected_outlets['id'].to_numpy()[nearest[is_covered]],
+        'demand_id': demand_centers['id'].to_numpy()[is_covered],
+        'distance': nearest_distance[is_covered],
+    })
+    logging.info(
+        "Maximal coverage: %d of %d demand centers covered (%.0f of %.0f population).",
+        is_covered.sum(), len(demand_centers), weights[is_covered].sum(), weights.sum(),
+    )
+    return assignments, selected_outlets
@@ -1,84 +1,129 @@
+import os
+import time
 import requests
-import networkx as nx
-from geopy.distance import geodesic
 import logging
-from shapely.geometry import LineString
+from metrics import CACHE_EVENTS, OSRM_REQUESTS, OSRM_SECONDS
+from edge_costs import attach_edge_costs, cost_weight, straight_line_cost
 
 logger = logging.getLogger(__name__)
 OSRM_CACHE = {}  # Cache for OSRM routes to reduce redundant API calls
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")  # Point at a local OSRM (or the benchmark stub)
+OSRM_PROFILES = ("driving", "walking", "cycling")  # Profiles accepted in the route URL
 
-def get_osrm_route(start, end):
+def check_profile(profile):
+    if profile not in OSRM_PROFILES:
+        raise ValueError(f"Unknown routingProfile '{profile}'. Use one of {', '.join(OSRM_PROFILES)}.")
+    return profile
+
+def get_osrm_route(start, end, profile="driving", annotations=False):
     """
-    Fetch a route from OSRM between two points.
+    Fetch a route from OSRM between two points with the given routing profile.
     Cache results to minimize redundant requests.
+    With annotations=True, returns (geometry, annotation) where the annotation holds
+    per-segment 'distance' (m) and 'duration' (s) lists.
     """
     global OSRM_CACHE
-    route_key = (start, end)
+    check_profile(profile)
+    route_key = (start, end, profile, annotations)
     if route_key in OSRM_CACHE:
+        CACHE_EVENTS.inc(cache='osrm_route', result='hit')
         return OSRM_CACHE[route_key]
-    
-    url = f"https://router.project-osrm.org/route/v1/driving/{start[1]},{start[0]};{end[1]},{end[0]}?overview=full&geometries=geojson"
+    CACHE_EVENTS.inc(cache='osrm_route', result='miss')
+
+    url = f"{OSRM_URL}/route/v1/{profile}/{start[1]},{start[0]};{end[1]},{end[0]}?overview=full&geometries=geojson"
+    if annotations:
+        url += "&annotations=distance,duration"
+    start_time = time.perf_counter()
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         if "routes" in data and len(data["routes"]) > 0:
             geometry = data["routes"][0]["geometry"]
+            if annotations:
+                annotation = {"distance": [], "duration": []}
+                for leg in data["routes"][0].get("legs", []):
+                    for key in annotation:
+                        annotation[key].extend(leg.get("annotation", {}).get(key, []))
+                geometry = (geometry, annotation)
             OSRM_CACHE[route_key] = geometry  # Cache the result
+            OSRM_REQUESTS.inc(outcome='ok')
             return geometry
         else:
-            logger.warning(f"No route found between {start} and {end}")
+            OSRM_REQUESTS.inc(outcome='no_route')
+            logger.warning("No route found between %s and %s", start, end)
             return None
     except requests.RequestException as e:
-        logger.error(f"Error fetching OSRM route: {e}")
+        OSRM_REQUESTS.inc(outcome='error')
+        logger.error("Error fetching OSRM route: %s", e)
         return None
+    finally:
+        OSRM_SECONDS.observe(time.perf_counter() - start_time)
 
-def calculate_road_distance(graph, lat1, lon1, lat2, lon2):
+def calculate_road_distance(graph, lat1, lon1, lat2, lon2, cost="distance", node1=None, node2=None):
     """
     Calculate the shortest road distance between two locations using the OSRM graph.
+    cost selects the edge cost (see edge_costs.COSTS): km for 'distance', minutes for the travel times.
+    node1/node2 are the graph nodes nearest to the two locations, when the caller has already snapped them.
     """
+    import networkx as nx
+    from geopy.distance import geodesic
+
     try:
-        node1 = find_nearest_node(graph, lat1, lon1)
-        node2 = find_nearest_node(graph, lat2, lon2)
+        node1 = node1 or find_nearest_node(graph, lat1, lon1)
+        node2 = node2 or find_nearest_node(graph, lat2, lon2)
 
         if node1 and node2:
-            return nx.shortest_path_length(graph, node1, node2, weight="weight")
+            return nx.shortest_path_length(graph, node1, node2, weight=cost_weight(graph, cost))
         else:
             logger.warning("Falling back to geodesic distance.")
-            return geodesic((lat1, lon1), (lat2, lon2)).km
+            return straight_line_cost(geodesic((lat1, lon1), (lat2, lon2)).km, cost)
     except Exception as e:
-        logger.error(f"Error calculating road distance: {e}")
-        return geodesic((lat1, lon1), (lat2, lon2)).km
+        logger.error("Error calculating road distance: %s", e)
+        return straight_line_cost(geodesic((lat1, lon1), (lat2, lon2)).km, cost)
 
-def load_graph_from_osrm_route(min_lat, min_lon, max_lat, max_lon):
+def load_graph_from_osrm_route(min_lat, min_lon, max_lat, max_lon, profile="driving"):
     """
     Create a road network graph for a bounding box using OSRM.
+    Edges keep their km length as 'weight' plus the OSRM segment time as 'duration' (minutes);
+    all edge costs are packed into graph.graph['edge_costs'].
     """
+    import networkx as nx
+    from geopy.distance import geodesic
+
     try:
         G = nx.Graph()
         start = (min_lat, min_lon)
         end = (max_lat, max_lon)
-        geometry = get_osrm_route(start, end)
+        route = get_osrm_route(start, end, profile=profile, annotations=True)
 
-        if geometry:
+        if route:
+            geometry, annotation = route
             coords = geometry["coordinates"]
+            durations = annotation["duration"] if len(annotation["duration"]) == len(coords) - 1 else None
             for i in range(len(coords) - 1):
                 point1 = tuple(coords[i])
                 point2 = tuple(coords[i + 1])
                 distance = geodesic((point1[1], point1[0]), (point2[1], point2[0])).km
-                G.add_edge(point1, point2, weight=distance)
+                if durations is None:
+                    G.add_edge(point1, point2, weight=distance)
+                else:
+                    G.add_edge(point1, point2, weight=distance, duration=durations[i] / 60)
+            attach_edge_costs(G)
             return G
         else:
             logger.error("Failed to load road network from OSRM.")
             return None
     except Exception as e:
-        logger.error(f"Unexpected error in graph creation: {e}")
+        logger.error("Unexpected error in graph creation: %s", e)
         return None
 
 def find_nearest_node(graph, lat, lon):
     """
     Find the nearest node in the road graph to the given latitude and longitude.
     """
+    from geopy.distance import geodesic
+
     try:
         nearest_node = min(
             graph.nodes,
@@ -87,5 +132,5 @@ def find_nearest_node(graph, lat, lon):
         )
         return nearest_node
     except Exception as e:
-        logger.error(f"Error finding nearest node: {e}")
+        logger.error("Error finding nearest node: %s", e)
         return None
@@ -0,0 +1,148 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Profiling is opt-in per deployment; when disabled, profiling_requested() is a single flag check
+PROFILING_ENABLED = os.getenv("ENABLE_REQUEST_PROFILING") == "1"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")  # Optional shared secret required in X-Profile-Token
+SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))
+# Profiles expose code paths and timings, so they are kept out of the public maps folder
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+
+def profiling_requested(request):
+    """
+    True when profiling is enabled in config and the request asks for it via
+    the X-Profile header or the ?profile= query flag (and carries the token, if one is configured).
+    """
+    if not PROFILING_ENABLED:
+        return False
+    mode = request.headers.get("X-Profile") or request.args.get("profile")
+    if not mode or mode.lower() in ("0", "false"):
+        return False
+    if not profile_access_allowed(request):
+        logger.warning("Profiling requested without a valid token; ignoring.")
+        return False
+    return True
+
+
+def profile_access_allowed(request):
+    """
+    True when profiling is enabled and the request carries the token, if one is configured.
+    Guards both taking profiles and downloading them.
+    """
+    if not PROFILING_ENABLED:
+        return False
+    return not PROFILING_TOKEN or hmac.compare_digest(request.headers.get("X-Profile-Token", ""), PROFILING_TOKEN)
+
+
+def profiling_mode(request):
+    mode = (request.headers.get("X-Profile") or request.args.get("profile") or "").lower()
+    return "cprofile" if mode == "cprofile" else "sample"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread at a fixed interval from a background thread
+    and aggregates identical stacks, producing collapsed-stack output.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def collapsed(self):
+        """
+        Brendan Gregg collapsed format ("a;b;c count" per line), importable by speedscope and flamegraph.pl.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def speedscope(self, name):
+        """
+        speedscope 'sampled' profile JSON.
+        """
+        frames, frame_index, samples, weights = [], {}, [], []
+        for stack, count in self.stacks.items():
+            indices = []
+            for frame in stack.split(";"):
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            }],
+            "name": name,
+            "exporter": "GeoOutletPlanner",
+        }
+
+
+def profile_call(fn, *args, mode="sample", folder=None, **kwargs):
+    """
+    Run fn under the sampler (or cProfile) and write the profile into folder (PROFILE_DIR by default).
+    Returns (fn result, profile filename).
+    """
+    folder = folder or PROFILE_DIR
+    os.makedirs(folder, exist_ok=True)
+    profile_id = f"profile_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args, **kwargs)
+        filename = f"{profile_id}.pstats"
+        profiler.dump_stats(os.path.join(folder, filename))
+        return result, filename
+
+    with StackSampler() as sampler:
+        result = fn(*args, **kwargs)
+    with open(os.path.join(folder, f"{profile_id}.collapsed.txt"), "w") as f:
+        f.write(sampler.collapsed())
+    filename = f"{profile_id}.speedscope.json"
+    with open(os.path.join(folder, filename), "w") as f:
+        json.dump(sampler.speedscope(profile_id), f)
+    logger.info("Stored request profile %s (%d samples).", filename, sampler.samples)
+    return result, filename
@@ -0,0 +1,124 @@
+import math
+import os
+
+import numpy as np
+
+from edge_costs import check_cost
+from optimization import optimize_outlet_location_fast, optimize_maximal_coverage
+
+MAX_SCENARIOS = int(os.getenv("MAX_BATCH_SCENARIOS", "50"))
+
+
+def check_solver_options(options):
+    """
+    nOutlets must be a whole number of at least 1 and coverageRadius a positive number of km;
+    raises ValueError otherwise.
+    """
+    for name, cast, default in (('nOutlets', int, 5), ('coverageRadius', float, 25)):
+        value = options.get(name, default)
+        try:
+            number = cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number, got {value!r}.") from None
+        if not (math.isfinite(number) and number > 0):
+            raise ValueError(f"{name} must be positive, got {value!r}.")
+    return options
+
+
+def expand_scenarios(data):
+    """
+    Scenario parameter dicts from a batch request: an explicit 'scenarios' list, or a 'pRange' of
+    [first, last] outlet counts. Top-level options apply to every scenario unless it overrides them.
+    """
+    base = {k: v for k, v in data.items() if k not in ('demandCenters', 'scenarios', 'pRange')}
+    if 'scenarios' in data:
+        scenarios = [dict(base, **scenario) for scenario in data['scenarios']]
+    elif 'pRange' in data:
+        first, last = (int(p) for p in data['pRange'])
+        scenarios = [dict(base, nOutlets=p) for p in range(first, last + 1)]
+    else:
+        raise ValueError("Provide 'scenarios' or 'pRange'.")
+    if not scenarios:
+        raise ValueError("No scenarios given.")
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios per batch.")
+    for scenario in scenarios:
+        check_solver_options(scenario)
+        check_cost(scenario.get('costType', 'distance'))
+    return scenarios
+
+
+def scenario_costs(scenarios):
+    """
+    Edge costs the p-median scenarios need distance tables for.
+    """
+    return sorted({s.get('costType', 'distance') for s in scenarios if s.get('mode') != 'coverage'})
+
+
+def candidate_pool(demand_centers, scenarios):
+    """
+    Initial outlets shared by all p-median scenarios: the largest requested sample, drawn the way the
+    single-run endpoint draws it. A scenario with p outlets starts from the first p rows (ids 1..p).
+    """
+    size = min(max(int(s.get('nOutlets', 5)) for s in scenarios), len(demand_centers))
+    pool = demand_centers.sample(size, random_state=42).reset_index(drop=True)
+    pool['id'] = range(1, size + 1)
+    return pool
+
+
+def solve_scenario(index, scenario, demand_centers, candidates, distances):
+    """
+    Run one scenario against the shared demand set, candidate pool and distance tables (keyed by costType).
+    Returns the scenario's outlets and assignments with its population-weighted cost.
+    """
+    scale = float(scenario.get('populationScale', 1))
+    if scale != 1:
+        demand_centers = demand_centers.assign(population=demand_centers['population'] * scale)
+    n_outlets = min(int(scenario.get('nOutlets', 5)), len(demand_centers))
+
+    if scenario.get('mode') == 'coverage':
+        coverage_candidates = demand_centers[['lat', 'lon']].copy()
+        coverage_candidates['id'] = range(1, len(coverage_candidates) + 1)
+        assignments, outlets = optimize_maximal_coverage(
+            coverage_candidates, demand_centers, n_outlets, float(scenario.get('coverageRadius', 25))
+        )
+    else:
+        # Hold the outlet count at p so the sweep compares p outlets against p + 1
+        assignments, outlets = optimize_outlet_location_fast(
+            candidates.head(n_outlets).copy(), demand_centers, None,
+            distances=distances[scenario.get('costType', 'distance')], min_outlets=n_outlets,
+        )
+
+    population = demand_centers.set_index('id')['population']
+    assigned_population = population.reindex(assignments['demand_id']).to_numpy()
+    return {
+        'index': index,
+        'params': scenario,
+        'nOutlets': n_outlets,
+        'outletsKept': len(outlets),
+        'cost': float(np.nansum(assignments['distance'].to_numpy() * assigned_population)),
+        'assignedPopulation': float(np.nansum(assigned_population)),
+        'totalPopulation': float(population.sum()),
+        'outlets': outlets,
+        'assignments': assignments,
+    }
+
+
+def run_scenarios(scenarios, demand_centers, candidates, distances):
+    """
+    Yield scenario results one by one. The runs stay in the request's thread: the distance tables are
+    shared, so each run is only a solver pass, and forking a process pool inside a threaded web worker
+    is not safe.
+    """
+    for index, scenario in enumerate(scenarios):
+        yield solve_scenario(index, scenario, demand_centers, candidates, distances)
+
+
+def cost_curve(results):
+    """
+    Cost against outlet count over all finished scenarios, ordered by p.
+    """
+    return [
+        {'index': r['index'], 'nOutlets': r['nOutlets'], 'outletsKept': r['outletsKept'], 'cost': r['cost']}
+        for r in sorted(results, key=lambda r: (r['nOutlets'], r['index']))
+    ]
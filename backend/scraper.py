@@ -1,79 +1,203 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.edge.options import Options
-from selenium.webdriver.edge.service import Service
+import argparse
 import csv
+import json
+import logging
+import os
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Path to your Microsoft Edge WebDriver executable
-driver_path = "C:/Users/raj37/Downloads/msedgedriver.exe"  # Update path as needed
-
-# Configure Edge WebDriver options
-options = Options()
-options.add_argument("--headless")  # Run in headless mode (no browser UI)
-options.add_argument("--disable-gpu")
-options.add_argument("--window-size=1920,1080")
-
-# Initialize Edge WebDriver
-driver = webdriver.Edge(service=Service(driver_path), options=options)
-
-# Base URL of the webpage to scrape
-base_url = "https://www.census2011.co.in/district.php?page="
-
-# Initialize a list to store all the data
-data = []
-
-# Set the starting page number
-page_number = 1
-
-# Define a maximum number of pages to scrape (for safety, you can adjust this as needed)
-max_pages = 100
-
-while page_number <= max_pages:
-    url = base_url + str(page_number)  # Generate the URL for the current page
-    
-    # Open the webpage
-    driver.get(url)
-    
-    # Wait for the table to load (adjust the timeout as needed)
-    time.sleep(3)  # Add a sleep time to ensure the page is fully loaded
-    
-    # Locate table rows
-    rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-    
-    if not rows:
-        print(f"No rows found on page {page_number}. Breaking out of loop.")
-        break  # Stop if no rows are found, indicating that we've reached the last page
-    
-    # Extract district and population
-    for row in rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
+import requests
+from lxml import html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Page URL template; point it at saved HTML fixtures (e.g. python -m http.server) for offline runs
+BASE_URL = "https://www.census2011.co.in/district.php?page={page}"
+CSV_FILENAME = os.path.join(BASE_DIR, "district_population_all_pages.csv")
+STATE_FILE = os.path.join(BASE_DIR, ".scraper_state.json")
+MAX_PAGES = 100
+USER_AGENT = "GeoOutletPlanner census refresh (+https://outletplanner.streamlit.app/)"
+
+
+class RateLimiter:
+    """
+    Politeness limit: at most one request start per min_interval seconds across all threads.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(pool_size=8):
+    """
+    Pooled HTTP session with keep-alive connections and retries on transient errors.
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def parse_rows(page_html):
+    """
+    Extract (district, population) rows from one census results page.
+    """
+    tree = html.fromstring(page_html)
+    rows = []
+    # .//tr: lxml keeps the markup as served and does not insert <tbody>; header rows have no <td> and are skipped
+    for tr in tree.xpath("//table[contains(concat(' ', normalize-space(@class), ' '), ' table ')]//tr"):
+        cols = tr.xpath("./td")
         if len(cols) > 3:  # Ensure there are enough columns
-            district = cols[1].text.strip()  # District name
-            population_str = cols[3].text.strip()  # Population (as string)
-            
+            district = cols[1].text_content().strip()  # District name
             # Clean the population string: remove commas, extra spaces, and non-numeric characters
-            cleaned_population_str = ''.join(filter(str.isdigit, population_str))
-            
-            # Try to convert to integer
-            try:
-                population = int(cleaned_population_str) if cleaned_population_str else 0
-            except ValueError:
-                population = 0  # If there's an issue with conversion, set population to 0
-            
-            data.append([district, population])
-
-    print(f"Scraped data from page {page_number}")
-    page_number += 1  # Move to the next page
-
-# Write the data to a CSV file
-csv_filename = "district_population_all_pages.csv"
-with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["District", "Population"])  # Write header row
-    writer.writerows(data)  # Write the data rows
-
-# Close the browser
-driver.quit()
-
-print(f"Data successfully scraped and saved to {csv_filename}")
+            digits = "".join(filter(str.isdigit, cols[3].text_content()))
+            rows.append([district, int(digits) if digits else 0])
+    return rows
+
+
+def fetch_page(session, limiter, url, cached=None, timeout=15):
+    """
+    Fetch and parse one page, sending ETag/Last-Modified validators from the previous run.
+    Returns (page state, changed). A 304 reuses the cached rows.
+    """
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    limiter.wait()
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        return cached, False
+    if response.status_code == 404:
+        return {"rows": []}, True
+    response.raise_for_status()
+    state = {
+        "rows": parse_rows(response.content),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return state, cached is None or state["rows"] != cached.get("rows")
+
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def atomic_write(path, write):
+    """
+    Write through a temporary file in the same directory and rename it into place.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def scrape(base_url=BASE_URL, max_pages=MAX_PAGES, concurrency=4, min_interval=0.25, state_file=STATE_FILE):
+    """
+    Fetch result pages concurrently in waves until an empty page is found.
+    Returns (rows in page order, whether anything changed since the previous run).
+    """
+    state = load_state(state_file)
+    session = make_session(pool_size=concurrency)
+    limiter = RateLimiter(min_interval)
+    pages, changed = {}, False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for wave_start in range(1, max_pages + 1, concurrency):
+            numbers = list(range(wave_start, min(wave_start + concurrency, max_pages + 1)))
+            urls = {n: base_url.format(page=n) for n in numbers}
+            results = executor.map(lambda n: fetch_page(session, limiter, urls[n], state.get(urls[n])), numbers)
+            last_page_reached = False
+            for n, (page_state, page_changed) in zip(numbers, results):
+                if not page_state["rows"]:
+                    logger.info("No rows found on page %d. Stopping.", n)
+                    last_page_reached = True
+                    break
+                pages[n] = page_state
+                state[urls[n]] = page_state
+                changed = changed or page_changed
+                logger.info("Scraped page %d (%s).", n, "changed" if page_changed else "unchanged")
+            if last_page_reached:
+                break
+
+    # Pages that disappeared since the last run also count as a change
+    stale = [url for url in state if url not in {base_url.format(page=n) for n in pages}]
+    for url in stale:
+        del state[url]
+    changed = changed or bool(stale)
+
+    atomic_write(state_file, lambda f: json.dump(state, f))
+    rows = [row for n in sorted(pages) for row in pages[n]["rows"]]
+    return rows, changed
+
+
+def write_population(rows, csv_filename=CSV_FILENAME, update_snapshot=True):
+    """
+    Atomically write the population CSV and publish the population into the district snapshot the app loads.
+    """
+    def write_csv(f):
+        writer = csv.writer(f)
+        writer.writerow(["District", "Population"])  # Write header row
+        writer.writerows(rows)  # Write the data rows
+
+    atomic_write(csv_filename, write_csv)
+    logger.info("Wrote %d districts to %s.", len(rows), csv_filename)
+
+    if update_snapshot:
+        from snapshot import read_population_csv, update_population
+        path = update_population(read_population_csv(csv_filename), source=os.path.basename(csv_filename))
+        if path:
+            logger.info("Published population into snapshot %s.", path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh district population data from census2011.co.in.")
+    parser.add_argument("--base-url", default=BASE_URL, help="Page URL template containing {page}")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--min-interval", type=float, default=0.25, help="Minimum seconds between request starts")
+    parser.add_argument("--output", default=CSV_FILENAME)
+    parser.add_argument("--state-file", default=STATE_FILE)
+    parser.add_argument("--force", action="store_true", help="Rewrite outputs even if nothing changed")
+    parser.add_argument("--no-snapshot", action="store_true", help="Only write the CSV")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    rows, changed = scrape(args.base_url, args.max_pages, args.concurrency, args.min_interval, args.state_file)
+    if not rows:
+        raise SystemExit("No rows scraped; leaving existing data untouched.")
+    if changed or args.force or not os.path.exists(args.output):
+        write_population(rows, args.output, update_snapshot=not args.no_snapshot)
+        print(f"Data successfully scraped and saved to {args.output}")
+    else:
+        print("Census pages unchanged since the last refresh; nothing to do.")
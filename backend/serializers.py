@@ -0,0 +1,108 @@
+import io
+import json
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+JSON_MIMETYPE = "application/json"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+FORMATS = {"json": JSON_MIMETYPE, "arrow": ARROW_MIMETYPE, "parquet": PARQUET_MIMETYPE}
+
+
+def negotiate_format(request, allow_query=True):
+    """
+    Pick the response format from ?format= or the Accept header. JSON is the default.
+    """
+    explicit = request.args.get("format") if allow_query else None
+    if explicit:
+        if explicit.lower() not in FORMATS:
+            raise ValueError(f"Unsupported format '{explicit}'. Use one of {', '.join(FORMATS)}.")
+        return explicit.lower()
+    best = request.accept_mimetypes.best_match(list(FORMATS.values()), default=JSON_MIMETYPE)
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default).encode("utf-8")
+
+
+def json_response(payload, status=200):
+    """
+    Serialize a response dict whose values may be DataFrames.
+    DataFrames are encoded column-wise by pandas' C encoder instead of building one dict per row.
+    """
+    import pandas as pd
+
+    parts = []
+    for key, value in payload.items():
+        if isinstance(value, pd.DataFrame):
+            encoded = value.to_json(orient="records", double_precision=15).encode("utf-8")
+        else:
+            encoded = encode_json(value)
+        parts.append(encode_json(str(key)) + b":" + encoded)
+    return Response(b"{" + b",".join(parts) + b"}", status=status, mimetype=JSON_MIMETYPE)
+
+
+def table_to_bytes(df, fmt, metadata=None):
+    """
+    Encode a DataFrame as an Arrow IPC stream or a Parquet file.
+    String metadata is attached to the Arrow schema.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        merged = dict(table.schema.metadata or {})
+        merged.update({str(k).encode(): str(v).encode() for k, v in metadata.items()})
+        table = table.replace_schema_metadata(merged)
+
+    sink = io.BytesIO()
+    if fmt == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        raise ValueError(f"Unsupported table format '{fmt}'.")
+    return sink.getvalue()
+
+
+def table_response(df, fmt, metadata=None, status=200):
+    """
+    Return a single table in the negotiated format. Metadata is also exposed as X- headers.
+    """
+    if fmt == "json":
+        return json_response(dict(metadata or {}, rows=df), status=status)
+    response = Response(table_to_bytes(df, fmt, metadata), status=status, mimetype=FORMATS[fmt])
+    for key, value in (metadata or {}).items():
+        response.headers[f"X-{key.replace('_', '-').title()}"] = str(value)
+    return response
+
+
+def write_table(df, path):
+    """
+    Persist a result table as Parquet so it can be served later in any format.
+    """
+    with open(path, "wb") as f:
+        f.write(table_to_bytes(df, "parquet"))
+
+
+def read_table(path):
+    import pyarrow.parquet as pq
+    return pq.read_table(path).to_pandas()
@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+from district_matching import match_districts
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ROOT = os.getenv("DISTRICT_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshots"))
+DISTRICTS_FILE = os.path.join(BASE_DIR, "india_district.geojson")
+POPULATION_DATA_FILE = os.path.join(BASE_DIR, "district_population_all_pages.csv")
+DEFAULT_POPULATION = 2876546
+
+
+def normalize_name(name):
+    return name.lower().strip() if name else None
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_population_csv(population_file):
+    """
+    Read the census CSV into a normalized district -> population table (first row wins on duplicates).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(population_file)
+    df.columns = df.columns.str.strip().str.lower()
+    df["district"] = df["district"].str.strip().str.lower()
+    df["population"] = pd.to_numeric(df["population"], errors="coerce")
+    return df.dropna(subset=["district", "population"]).drop_duplicates("district")[["district", "population"]]
+
+
+def population_lookup_table(census_districts, census_populations, districts, populations):
+    """
+    Normalized district name -> population used by DistrictIndex.population_for: every census row, plus each
+    shapefile spelling with the census population it was matched to, so lookups need no fuzzy matching at runtime.
+    """
+    lookup = {district: int(value) for district, value in zip(census_districts, census_populations)}
+    lookup.update(
+        (name, int(value)) for name, value in zip(districts, populations) if name and not np.isnan(value)
+    )
+    return lookup
+
+
+def _write_parquet(table, path):
+    import pyarrow.parquet as pq
+    pq.write_table(table, path, compression="zstd")
+
+
+def _atomic_write_text(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(districts_file=DISTRICTS_FILE, population_file=POPULATION_DATA_FILE, snapshot_root=SNAPSHOT_ROOT):
+    """
+    Build a versioned district snapshot from the district GeoJSON and the population CSV.
+    Writes WKB geometries with bounds and the fuzzy-matched population to districts.parquet,
+    the normalized population table to population.parquet, and points CURRENT at the new version.
+    """
+    import geopandas as gpd
+    import pyarrow as pa
+    import shapely
+
+    districts_gdf = gpd.read_file(districts_file)
+    population_df = read_population_csv(population_file)
+
+    names = districts_gdf["NAME_2"].fillna("").astype(str).tolist()
+    normalized = [normalize_name(name) or "" for name in names]
+    populations, report = match_districts(names, population_df)
+    shape_ids = districts_gdf["ID_2"].astype("int64") if "ID_2" in districts_gdf else np.arange(len(names))
+    geometries = districts_gdf.geometry.to_numpy()
+    bounds = shapely.bounds(geometries)
+
+    districts_table = pa.table({
+        "shape_id": np.asarray(shape_ids, dtype=np.int64),
+        "name": names,
+        "district": normalized,
+        "population": pa.array(populations, type=pa.int64()),
+        "minx": bounds[:, 0],
+        "miny": bounds[:, 1],
+        "maxx": bounds[:, 2],
+        "maxy": bounds[:, 3],
+        "geometry": shapely.to_wkb(geometries),
+    })
+    population_table = pa.table({
+        "district": population_df["district"].tolist(),
+        "population": population_df["population"].astype("int64").to_numpy(),
+    })
+
+    source_hash = hashlib.sha256(
+        (_file_hash(districts_file) + _file_hash(population_file)).encode()
+    ).hexdigest()[:12]
+    sources = {"districts": os.path.basename(districts_file), "population": os.path.basename(population_file)}
+    return _publish_snapshot(snapshot_root, source_hash, districts_table, population_table, sources, report)
+
+
+def _publish_snapshot(snapshot_root, content_hash, districts_table, population_table, sources, report):
+    """
+    Write a snapshot version into a staging directory, move it into place and switch CURRENT to it.
+    Readers either see the previous version or the complete new one.
+    The name-matching report is stored next to the tables as matching_report.json.
+    """
+    import pyarrow.compute as pc
+
+    version = f"v{SNAPSHOT_VERSION}-{content_hash}"
+    os.makedirs(snapshot_root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=snapshot_root, prefix=".staging-")
+
+    _write_parquet(districts_table, os.path.join(staging, "districts.parquet"))
+    _write_parquet(population_table, os.path.join(staging, "population.parquet"))
+    manifest = {
+        "version": version,
+        "format": SNAPSHOT_VERSION,
+        "created": time.time(),
+        "districts": districts_table.num_rows,
+        "populations": population_table.num_rows,
+        "matched": districts_table.num_rows - pc.sum(pc.is_null(districts_table.column("population"))).as_py(),
+        "sources": sources,
+        "matching": {key: len(value) if isinstance(value, list) else value for key, value in report.items()},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(staging, "matching_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    if report["unmatched"] or report["ambiguous"]:
+        logger.warning(
+            "%d unmatched and %d ambiguous district names fall back to the default population; see matching_report.json.",
+            len(report["unmatched"]), len(report["ambiguous"]),
+        )
+
+    target = os.path.join(snapshot_root, version)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    _atomic_write_text(os.path.join(snapshot_root, "CURRENT"), version)
+    logger.info("District snapshot %s written to %s.", version, target)
+    return target
+
+
+def update_population(population_df, snapshot_root=SNAPSHOT_ROOT, source="population refresh"):
+    """
+    Publish a new snapshot version that keeps the current district geometries
+    and replaces the population table and its join. Returns the new path, or None without a snapshot.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    current = current_snapshot_path(snapshot_root)
+    if current is None:
+        logger.warning("No district snapshot to update; build one with 'python snapshot.py'.")
+        return None
+
+    population_df = population_df.dropna(subset=["district", "population"]).drop_duplicates("district")
+    districts_table = pq.read_table(os.path.join(current, "districts.parquet"))
+    populations, report = match_districts(districts_table.column("name").to_pylist(), population_df)
+    joined = pa.array(populations, type=pa.int64())
+    districts_table = districts_table.set_column(districts_table.schema.get_field_index("population"), "population", joined)
+    population_table = pa.table({
+        "district": population_df["district"].tolist(),
+        "population": population_df["population"].astype("int64").to_numpy(),
+    })
+
+    with open(os.path.join(current, "manifest.json")) as f:
+        sources = dict(json.load(f).get("sources", {}), population=source)
+    content_hash = hashlib.sha256(
+        os.path.basename(current).encode() + population_df.to_csv(index=False).encode()
+    ).hexdigest()[:12]
+    return _publish_snapshot(snapshot_root, content_hash, districts_table, population_table, sources, report)
+
+
+class DistrictIndex:
+    """
+    District polygons with joined populations and an STRtree for batched point lookups.
+    """
+
+    def __init__(self, names, districts, populations, geometries, population_lookup, version=None, shape_ids=None):
+        from shapely import STRtree
+
+        self.names = np.asarray(names, dtype=object)
+        self.districts = np.asarray(districts, dtype=object)
+        self.populations = np.asarray(populations, dtype=np.float64)  # NaN where the census has no match
+        self.geometries = geometries
+        self.population_lookup = population_lookup
+        self.version = version
+        self.shape_ids = np.arange(len(self.names)) if shape_ids is None else np.asarray(shape_ids)
+        self.shape_rows = {int(shape_id): row for row, shape_id in enumerate(self.shape_ids)}
+        self.tree = STRtree(geometries)
+        self._gdf = None
+
+    def lookup(self, lats, lons):
+        """
+        Return the district row index for each point, or -1 when the point is outside every district.
+        """
+        import shapely
+
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        point_idx, district_idx = self.tree.query(points, predicate="within")
+        result = np.full(len(points), -1, dtype=np.int64)
+        # Keep the lowest district index per point, like the sequential scan did (last write wins)
+        order = np.argsort(district_idx, kind="stable")[::-1]
+        result[point_idx[order]] = district_idx[order]
+        return result
+
+    def find_districts(self, lats, lons):
+        rows = self.lookup(lats, lons)
+        names = np.where(rows >= 0, self.districts[np.maximum(rows, 0)], "Unknown")
+        return names, rows
+
+    def population_for_rows(self, rows, default=DEFAULT_POPULATION):
+        populations = np.where(rows >= 0, self.populations[np.maximum(rows, 0)], np.nan)
+        return np.where(np.isnan(populations), default, populations)
+
+    def population_for_name(self, name, default=DEFAULT_POPULATION):
+        return self.population_lookup.get(normalize_name(name), default)
+
+    def population_for_shape_id(self, shape_id, default=DEFAULT_POPULATION):
+        row = self.shape_rows.get(int(shape_id))
+        if row is None or np.isnan(self.populations[row]):
+            return default
+        return self.populations[row]
+
+    def to_geodataframe(self):
+        """
+        District polygons with a population column, built once on first use.
+        """
+        if self._gdf is None:
+            import geopandas as gpd
+            self._gdf = gpd.GeoDataFrame(
+                {"NAME_2": self.names, "population": np.nan_to_num(self.populations, nan=DEFAULT_POPULATION)},
+                geometry=list(self.geometries),
+                crs="EPSG:4326",
+            )
+        return self._gdf
+
+
+def current_snapshot_path(snapshot_root=SNAPSHOT_ROOT):
+    pointer = os.path.join(snapshot_root, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        path = os.path.join(snapshot_root, f.read().strip())
+    return path if os.path.isdir(path) else None
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot directory into a DistrictIndex without importing geopandas.
+    """
+    import pyarrow.parquet as pq
+    import shapely
+
+    districts = pq.read_table(os.path.join(path, "districts.parquet"))
+    population = pq.read_table(os.path.join(path, "population.parquet"))
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    geometries = shapely.from_wkb(districts.column("geometry").to_numpy(zero_copy_only=False))
+    populations = districts.column("population").to_numpy(zero_copy_only=False).astype(np.float64)
+    names = districts.column("district").to_pylist()
+    population_lookup = population_lookup_table(
+        population.column("district").to_pylist(), population.column("population").to_pylist(), names, populations
+    )
+    shape_ids = districts.column("shape_id").to_numpy() if "shape_id" in districts.column_names else None
+    return DistrictIndex(
+        districts.column("name").to_pylist(),
+        names,
+        populations,
+        geometries,
+        population_lookup,
+        version=manifest.get("version"),
+        shape_ids=shape_ids,
+    )
+
+
+def load_from_sources(districts_file=DISTRICTS_FILE, population_file=POPULATION_DATA_FILE):
+    """
+    Slow path used when no snapshot has been built: parse the GeoJSON and CSV directly.
+    """
+    import geopandas as gpd
+
+    districts_gdf = gpd.read_file(districts_file)
+    names = districts_gdf["NAME_2"].fillna("").astype(str).tolist()
+    normalized = [normalize_name(name) or "" for name in names]
+    if os.path.exists(population_file):
+        population_df = read_population_csv(population_file)
+        matched, _ = match_districts(names, population_df)
+        populations = [np.nan if value is None else value for value in matched]
+        population_lookup = population_lookup_table(
+            population_df["district"], population_df["population"], normalized, populations
+        )
+    else:
+        logger.warning("Population data file '%s' not found. Using default values.", population_file)
+        population_lookup = {}
+        populations = [np.nan] * len(names)
+    shape_ids = districts_gdf["ID_2"].to_numpy() if "ID_2" in districts_gdf else None
+    return DistrictIndex(names, normalized, populations, districts_gdf.geometry.to_numpy(), population_lookup, shape_ids=shape_ids)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_district_index():
+    """
+    Load the district index lazily on first use and reuse it for the lifetime of the worker.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                start = time.perf_counter()
+                path = current_snapshot_path()
+                if path:
+                    _index = load_snapshot(path)
+                else:
+                    logger.warning("No district snapshot found; loading from source files. Run 'python snapshot.py'.")
+                    _index = load_from_sources()
+                logger.info("District index loaded in %.1f ms.", (time.perf_counter() - start) * 1000)
+    return _index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the precomputed district and population snapshot.")
+    parser.add_argument("--districts", default=DISTRICTS_FILE)
+    parser.add_argument("--population", default=POPULATION_DATA_FILE)
+    parser.add_argument("--out", default=SNAPSHOT_ROOT)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    print(build_snapshot(args.districts, args.population, args.out))
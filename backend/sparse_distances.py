@@ -0,0 +1,178 @@
+import logging
+
+import numpy as np
+
+from edge_costs import COSTS, SOURCE_CHUNK, edge_cost_columns, get_edge_costs, straight_line_cost
+from metrics import span, MATRIX_CELLS
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371
+DEFAULT_K = 8
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def snap_to_nodes(road_graph, lats, lons):
+    """
+    Nearest graph node for every point in one haversine BallTree query
+    (find_nearest_node does the same for a single point with a linear geodesic scan).
+    """
+    from sklearn.neighbors import BallTree
+
+    nodes = list(road_graph.nodes)
+    node_coords = np.radians([[lat, lon] for lon, lat in nodes])
+    _, idx = BallTree(node_coords, metric='haversine').query(np.radians(np.column_stack([lats, lons])), k=1)
+    return [nodes[i] for i in idx[:, 0]]
+
+
+class SparseDistances:
+    """
+    Road distances from each demand center to its k nearest candidate outlets, stored CSR-style:
+    row d holds candidate positions indices[indptr[d]:indptr[d + 1]] (sorted) and their float32 costs in data.
+    Pairs outside the stored neighbourhood are routed on demand and cached.
+    Views returned by restrict() share the arrays and only carry a mask of active candidates.
+    Values are in the unit of cost (km for 'distance', minutes for travel times).
+    """
+
+    def __init__(self, outlets, demand_centers, indptr, indices, data, road_graph=None, active=None, _cache=None,
+                 cost="distance"):
+        self.outlet_ids = outlets['id'].to_numpy()
+        self.outlet_coords = outlets[['lat', 'lon']].to_numpy(dtype=float)
+        self.demand_ids = demand_centers['id'].to_numpy()
+        self.demand_coords = demand_centers[['lat', 'lon']].to_numpy(dtype=float)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.road_graph = road_graph
+        self.cost = cost
+        self.active = np.ones(len(self.outlet_ids), dtype=bool) if active is None else active
+        self._cache = {} if _cache is None else _cache  # (demand pos, candidate pos) -> cost, shared by views
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def restrict(self, outlet_ids):
+        """
+        View limited to the given outlet ids, without copying the stored distances.
+        """
+        view = object.__new__(SparseDistances)
+        view.__dict__.update(self.__dict__)
+        view.active = self.active & np.isin(self.outlet_ids, np.asarray(outlet_ids))
+        return view
+
+    def pair(self, demand_pos, candidate_pos):
+        """
+        Distance for one pair: stored if within the k nearest, otherwise routed now and cached.
+        """
+        start, end = self.indptr[demand_pos], self.indptr[demand_pos + 1]
+        row = self.indices[start:end]
+        hit = np.searchsorted(row, candidate_pos)
+        if hit < len(row) and row[hit] == candidate_pos:
+            return float(self.data[start + hit])
+        key = (demand_pos, candidate_pos)
+        if key not in self._cache:
+            self._cache[key] = self._route(demand_pos, candidate_pos)
+        return self._cache[key]
+
+    def _route(self, demand_pos, candidate_pos):
+        (olat, olon), (dlat, dlon) = self.outlet_coords[candidate_pos], self.demand_coords[demand_pos]
+        if self.road_graph is None:
+            return straight_line_cost(_haversine_km(olat, olon, dlat, dlon), self.cost)
+        from osm_utils import calculate_road_distance
+        return float(calculate_road_distance(self.road_graph, olat, olon, dlat, dlon, cost=self.cost))
+
+    def nearest(self, fallback_k=DEFAULT_K):
+        """
+        Nearest active candidate per demand center as a long-form (outlet_id, demand_id, distance) table.
+        Rows whose stored neighbours are all inactive route to their fallback_k closest active candidates.
+        """
+        import pandas as pd
+
+        n_demand = len(self.demand_ids)
+        active_positions = np.flatnonzero(self.active)
+        if n_demand == 0 or len(active_positions) == 0:
+            return pd.DataFrame({'outlet_id': [], 'demand_id': [], 'distance': []})
+
+        values = np.where(self.active[self.indices], self.data, np.float32(np.inf))
+        row_of_entry = np.repeat(np.arange(n_demand), np.diff(self.indptr))
+        order = np.lexsort((values, row_of_entry))  # Per row, the smallest active distance comes first
+        first = order[self.indptr[:-1]]
+        best_candidate = self.indices[first].astype(np.int64)
+        best_distance = values[first].astype(np.float64)
+
+        missing = np.flatnonzero(~np.isfinite(best_distance))
+        if len(missing):
+            logger.info("Routing %d demand centers outside their stored neighbourhood.", len(missing))
+            active_coords = self.outlet_coords[active_positions]
+            for demand_pos in missing:
+                lat, lon = self.demand_coords[demand_pos]
+                straight = _haversine_km(lat, lon, active_coords[:, 0], active_coords[:, 1])
+                shortlist = active_positions[np.argsort(straight)[:fallback_k]]
+                routed = [self.pair(demand_pos, c) for c in shortlist]
+                best_candidate[demand_pos] = shortlist[int(np.argmin(routed))]
+                best_distance[demand_pos] = min(routed)
+
+        return pd.DataFrame({
+            'outlet_id': self.outlet_ids[best_candidate],
+            'demand_id': self.demand_ids,
+            'distance': best_distance,
+        })
+
+
+def build_sparse_distances(outlets, demand_centers, road_graph, k=DEFAULT_K, cost="distance"):
+    """
+    Road costs from every demand center to its k nearest candidates only.
+    A haversine BallTree picks the k candidates per demand center; multi-source csgraph runs over
+    the graph's edge cost arrays then measure every stored pair, a chunk of candidates at a time.
+    Unreachable pairs fall back to the straight-line estimate.
+    """
+    from sklearn.neighbors import BallTree
+
+    outlets = outlets.reset_index(drop=True)
+    demand_centers = demand_centers.reset_index(drop=True)
+    n_demand, n_candidates = len(demand_centers), len(outlets)
+    k = max(1, min(k, n_candidates))
+    MATRIX_CELLS.observe(n_demand * k)
+
+    with span('distance_matrix'):
+        demand_lat = demand_centers['lat'].to_numpy(dtype=float)
+        demand_lon = demand_centers['lon'].to_numpy(dtype=float)
+        candidate_lat = outlets['lat'].to_numpy(dtype=float)
+        candidate_lon = outlets['lon'].to_numpy(dtype=float)
+
+        tree = BallTree(np.radians(np.column_stack([candidate_lat, candidate_lon])), metric='haversine')
+        _, neighbours = tree.query(np.radians(np.column_stack([demand_lat, demand_lon])), k=k)
+        neighbours = np.sort(neighbours, axis=1).astype(np.int32)
+
+        rows = np.repeat(np.arange(n_demand), k)
+        cols = neighbours.ravel()
+        straight = _haversine_km(demand_lat[rows], demand_lon[rows], candidate_lat[cols], candidate_lon[cols])
+        data = np.ascontiguousarray(edge_cost_columns(straight)[:, COSTS.index(cost)])
+
+        if road_graph is not None and road_graph.number_of_nodes():
+            with span('snapping'):
+                demand_nodes = snap_to_nodes(road_graph, demand_lat, demand_lon)
+                candidate_nodes = snap_to_nodes(road_graph, candidate_lat, candidate_lon)
+            edge_costs = get_edge_costs(road_graph)
+            target_nodes = list(dict.fromkeys(demand_nodes))
+            target_pos = {node: i for i, node in enumerate(target_nodes)}
+            entry_target = np.array([target_pos[demand_nodes[r]] for r in range(n_demand)], dtype=np.int64)[rows]
+            for start in range(0, n_candidates, SOURCE_CHUNK):
+                entries = np.flatnonzero((cols >= start) & (cols < start + SOURCE_CHUNK))
+                if len(entries) == 0:
+                    continue
+                chunk = edge_costs.matrices(candidate_nodes[start:start + SOURCE_CHUNK], target_nodes, costs=[cost])[cost]
+                routed = chunk[cols[entries] - start, entry_target[entries]]
+                reachable = np.isfinite(routed)
+                data[entries[reachable]] = routed[reachable]
+
+    indptr = np.arange(0, n_demand * k + 1, k, dtype=np.int64)
+    distances = SparseDistances(outlets, demand_centers, indptr, cols, data, road_graph=road_graph, cost=cost)
+    logger.info("Sparse distances: %d x %d pairs of %d candidates, %.1f MB.", n_demand, k, n_candidates, distances.nbytes / 2 ** 20)
+    return distances
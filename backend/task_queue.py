@@ -0,0 +1,431 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# sqlite:///<path> for a single node, redis://host:6379/0 to share the queue between nodes
+TASK_QUEUE_URL = os.getenv("TASK_QUEUE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'tasks.sqlite3')}")
+MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+RETRY_DELAY_SECONDS = float(os.getenv("TASK_RETRY_DELAY", "5"))  # Multiplied by the attempt number
+STALE_AFTER_SECONDS = float(os.getenv("TASK_STALE_AFTER", "60"))  # Running tasks without a heartbeat this long are retried
+RESULT_TTL_SECONDS = int(os.getenv("TASK_RESULT_TTL", str(7 * 24 * 3600)))
+
+
+class QueueBackend(ABC):
+    """
+    Task queue with at-least-once delivery. A worker claims a task, heartbeats while it runs and
+    completes or fails it; failed or abandoned tasks are retried until max_attempts is used up.
+    Completion, failure and heartbeats only take effect for the worker that currently owns the task.
+    """
+
+    @abstractmethod
+    def enqueue(self, payload, max_attempts=MAX_ATTEMPTS):
+        """Store a new task and return its id."""
+
+    @abstractmethod
+    def claim(self, worker_id):
+        """Hand the oldest ready task to worker_id, or return None when none is ready."""
+
+    @abstractmethod
+    def heartbeat(self, task_id, worker_id):
+        """Mark the task as alive; False when worker_id no longer owns it."""
+
+    @abstractmethod
+    def complete(self, task_id, worker_id, result, artifacts=None):
+        """Store the result and artifacts (name -> bytes); False when worker_id no longer owns the task."""
+
+    @abstractmethod
+    def fail(self, task_id, worker_id, error):
+        """Retry the task later or, with its attempts used up, mark it failed; False when not owned."""
+
+    @abstractmethod
+    def get(self, task_id, include_payload=False):
+        """Task state as a dict, or None for unknown or expired tasks."""
+
+    @abstractmethod
+    def get_artifact(self, task_id, name):
+        """Bytes of a stored artifact, or None."""
+
+    @abstractmethod
+    def requeue_stale(self, stale_after=STALE_AFTER_SECONDS):
+        """Retry running tasks whose last heartbeat is older than stale_after; returns how many."""
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    created REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started REAL,
+    heartbeat REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_queued ON tasks (status, available_at, created);
+CREATE TABLE IF NOT EXISTS artifacts (
+    task_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (task_id, name)
+);
+"""
+
+
+class SQLiteQueue(QueueBackend):
+    """
+    Queue in one SQLite file (WAL mode). Any number of worker processes on the same node can share it;
+    claims take a write lock, so each task goes to exactly one of them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def enqueue(self, payload, max_attempts=MAX_ATTEMPTS):
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO tasks (id, status, payload, max_attempts, created, available_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (task_id, json.dumps(payload), max_attempts, now, now),
+            )
+            # Drop results that have outlived their TTL while we hold the write lock anyway
+            expired = "SELECT id FROM tasks WHERE finished IS NOT NULL AND finished < ?"
+            conn.execute(f"DELETE FROM artifacts WHERE task_id IN ({expired})", (now - RESULT_TTL_SECONDS,))
+            conn.execute("DELETE FROM tasks WHERE finished IS NOT NULL AND finished < ?", (now - RESULT_TTL_SECONDS,))
+        return task_id
+
+    def claim(self, worker_id):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM tasks WHERE status = 'queued' AND available_at <= ? ORDER BY created LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, attempts = attempts + 1, started = ?, heartbeat = ? "
+                "WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+        return self.get(row["id"], include_payload=True)
+
+    def heartbeat(self, task_id, worker_id):
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), task_id, worker_id),
+            ).rowcount
+        return updated == 1
+
+    def complete(self, task_id, worker_id, result, artifacts=None):
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET status = 'done', finished = ?, result = ?, error = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), json.dumps(result), task_id, worker_id),
+            ).rowcount
+            if updated:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO artifacts (task_id, name, data) VALUES (?, ?, ?)",
+                    [(task_id, name, data) for name, data in (artifacts or {}).items()],
+                )
+        return updated == 1
+
+    def fail(self, task_id, worker_id, error):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM tasks WHERE id = ? AND worker = ? AND status = 'running'",
+                (task_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return False
+            if row["attempts"] < row["max_attempts"]:
+                conn.execute(
+                    "UPDATE tasks SET status = 'queued', worker = NULL, available_at = ?, error = ? WHERE id = ?",
+                    (now + RETRY_DELAY_SECONDS * row["attempts"], error, task_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', finished = ?, error = ? WHERE id = ?", (now, error, task_id)
+                )
+        return True
+
+    def requeue_stale(self, stale_after=STALE_AFTER_SECONDS):
+        conn = self._connect()
+        try:
+            stale = conn.execute(
+                "SELECT id, worker FROM tasks WHERE status = 'running' AND heartbeat < ?", (time.time() - stale_after,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return sum(self.fail(row["id"], row["worker"], "Worker heartbeat lost") for row in stale)
+
+    def get(self, task_id, include_payload=False):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            names = [r["name"] for r in conn.execute("SELECT name FROM artifacts WHERE task_id = ?", (task_id,))]
+        finally:
+            conn.close()
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"]) if include_payload else None
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        task["artifacts"] = names
+        return task
+
+    def get_artifact(self, task_id, name):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT data FROM artifacts WHERE task_id = ? AND name = ?", (task_id, name)).fetchone()
+        finally:
+            conn.close()
+        return bytes(row["data"]) if row else None
+
+
+TASK_STATE_FIELDS = ("status", "worker", "attempts", "max_attempts", "heartbeat")
+
+
+class RedisQueue(QueueBackend):
+    """
+    Queue in Redis, shared by workers on any number of nodes. Tasks are hashes; ids move between
+    a 'queued' list, a 'running' sorted set scored by last heartbeat and a 'delayed' sorted set
+    scored by the time a retry becomes due. Finished tasks and their artifacts expire after RESULT_TTL_SECONDS.
+    """
+
+    def __init__(self, client, prefix="outlet_planner:tasks"):
+        self.redis = client
+        self.prefix = prefix
+        self.queued = f"{prefix}:queued"
+        self.running = f"{prefix}:running"
+        self.delayed = f"{prefix}:delayed"
+
+    def _key(self, task_id):
+        return f"{self.prefix}:task:{task_id}"
+
+    def _artifact_key(self, task_id, name):
+        return f"{self.prefix}:artifact:{task_id}:{name}"
+
+    def enqueue(self, payload, max_attempts=MAX_ATTEMPTS):
+        task_id = uuid.uuid4().hex
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(task_id), mapping={
+            "status": "queued", "payload": json.dumps(payload), "attempts": 0,
+            "max_attempts": max_attempts, "created": time.time(),
+        })
+        pipe.lpush(self.queued, task_id)
+        pipe.execute()
+        return task_id
+
+    def _promote_delayed(self):
+        for task_id in self.redis.zrangebyscore(self.delayed, 0, time.time()):
+            if self.redis.zrem(self.delayed, task_id):  # Only the worker that removed it re-queues it
+                self.redis.lpush(self.queued, task_id)
+
+    def claim(self, worker_id):
+        from redis.exceptions import WatchError
+
+        self._promote_delayed()
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.queued)
+                    task_id = pipe.lindex(self.queued, -1)
+                    if task_id is None:
+                        pipe.unwatch()
+                        return None
+                    task_id = task_id.decode()
+                    now = time.time()
+                    pipe.multi()
+                    pipe.rpop(self.queued)
+                    pipe.zadd(self.running, {task_id: now})
+                    pipe.hset(self._key(task_id), mapping={
+                        "status": "running", "worker": worker_id, "started": now, "heartbeat": now,
+                    })
+                    pipe.hincrby(self._key(task_id), "attempts", 1)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue  # Another worker claimed the head of the queue first
+        return self.get(task_id, include_payload=True)
+
+    def _update_task(self, task_id, check, write):
+        """
+        Read the task's state fields with its hash WATCHed and, if check(task) holds, queue
+        write(pipe, task) in a MULTI block, so the check and the writes take effect together.
+        Retries when another client changes the task in between. Returns the task as read, or None.
+        """
+        from redis.exceptions import WatchError
+
+        key = self._key(task_id)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    values = pipe.hmget(key, *TASK_STATE_FIELDS)
+                    task = {f: v.decode() if v is not None else None for f, v in zip(TASK_STATE_FIELDS, values)}
+                    if not check(task):
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    write(pipe, task)
+                    pipe.execute()
+                    return task
+                except WatchError:
+                    continue
+
+    def _update_owned(self, task_id, worker_id, write):
+        def owned(task):
+            return task["worker"] == worker_id and task["status"] == "running"
+
+        return self._update_task(task_id, owned, write) is not None
+
+    def _end_attempt(self, pipe, task_id, task, error):
+        """
+        Queue the writes that retry a running task after a delay, or fail it once its attempts are used up.
+        """
+        attempts = int(task["attempts"] or 0)
+        max_attempts = int(task["max_attempts"] or MAX_ATTEMPTS)
+        pipe.zrem(self.running, task_id)
+        if attempts < max_attempts:
+            pipe.hset(self._key(task_id), mapping={"status": "queued", "worker": "", "error": error})
+            pipe.zadd(self.delayed, {task_id: time.time() + RETRY_DELAY_SECONDS * attempts})
+        else:
+            pipe.hset(self._key(task_id), mapping={"status": "failed", "finished": time.time(), "error": error})
+            pipe.expire(self._key(task_id), RESULT_TTL_SECONDS)
+
+    def heartbeat(self, task_id, worker_id):
+        def write(pipe, task):
+            now = time.time()
+            pipe.zadd(self.running, {task_id: now}, xx=True)
+            pipe.hset(self._key(task_id), "heartbeat", now)
+
+        return self._update_owned(task_id, worker_id, write)
+
+    def complete(self, task_id, worker_id, result, artifacts=None):
+        artifacts = artifacts or {}
+
+        def write(pipe, task):
+            pipe.zrem(self.running, task_id)
+            pipe.hset(self._key(task_id), mapping={
+                "status": "done", "finished": time.time(), "result": json.dumps(result),
+                "artifacts": json.dumps(sorted(artifacts)), "error": "",
+            })
+            pipe.expire(self._key(task_id), RESULT_TTL_SECONDS)
+            for name, data in artifacts.items():
+                pipe.set(self._artifact_key(task_id, name), data, ex=RESULT_TTL_SECONDS)
+
+        return self._update_owned(task_id, worker_id, write)
+
+    def fail(self, task_id, worker_id, error):
+        return self._update_owned(task_id, worker_id, lambda pipe, task: self._end_attempt(pipe, task_id, task, error))
+
+    def requeue_stale(self, stale_after=STALE_AFTER_SECONDS):
+        cutoff = time.time() - stale_after
+
+        def stale(task):
+            # Ids of tasks that finished, expired or were re-queued already are just dropped from the running set
+            return task["status"] != "running" or float(task["heartbeat"] or 0) < cutoff
+
+        def write(pipe, task):
+            pipe.zrem(self.running, task_id)
+            if task["status"] == "running":
+                self._end_attempt(pipe, task_id, task, "Worker heartbeat lost")
+
+        requeued = 0
+        for task_id in self.redis.zrangebyscore(self.running, 0, cutoff):
+            task_id = task_id.decode()
+            task = self._update_task(task_id, stale, write)
+            requeued += task is not None and task["status"] == "running"
+        return requeued
+
+    def get(self, task_id, include_payload=False):
+        raw = self.redis.hgetall(self._key(task_id))
+        if not raw:
+            return None
+        fields = {k.decode(): v.decode() for k, v in raw.items()}
+
+        def number(name, cast=float):
+            return cast(fields[name]) if fields.get(name) else None
+
+        return {
+            "id": task_id,
+            "status": fields["status"],
+            "payload": json.loads(fields["payload"]) if include_payload else None,
+            "attempts": number("attempts", int),
+            "max_attempts": number("max_attempts", int),
+            "worker": fields.get("worker") or None,
+            "created": number("created"),
+            "started": number("started"),
+            "heartbeat": number("heartbeat"),
+            "finished": number("finished"),
+            "result": json.loads(fields["result"]) if fields.get("result") else None,
+            "error": fields.get("error") or None,
+            "artifacts": json.loads(fields.get("artifacts", "[]")),
+        }
+
+    def get_artifact(self, task_id, name):
+        return self.redis.get(self._artifact_key(task_id, name))
+
+
+_queues = {}
+
+
+def get_queue(url=None):
+    """
+    Queue backend for a URL: sqlite:///<path>, redis://... (or rediss://), or fakeredis:// for an
+    in-process Redis stand-in in tests. One instance per URL and process.
+    """
+    url = url or TASK_QUEUE_URL
+    if url not in _queues:
+        if url.startswith("sqlite:///"):
+            _queues[url] = SQLiteQueue(url[len("sqlite:///"):])
+        elif url.startswith(("redis://", "rediss://")):
+            import redis  # Optional dependency, only needed for multi-node queues
+            _queues[url] = RedisQueue(redis.Redis.from_url(url))
+        elif url.startswith("fakeredis://"):
+            import fakeredis
+            _queues[url] = RedisQueue(fakeredis.FakeRedis())
+        else:
+            raise ValueError(f"Unsupported task queue URL '{url}'.")
+    return _queues[url]
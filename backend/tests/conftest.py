@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import osm_utils
+import snapshot
+from benchmarks.osrm_stub import start_stub_server
+
+
+@pytest.fixture
+def district_index(monkeypatch):
+    """
+    Two adjacent districts around Bengaluru, installed as the process-wide district index.
+    """
+    import shapely
+
+    geometries = np.array([shapely.box(77.0, 12.0, 77.5, 13.0), shapely.box(77.5, 12.0, 78.0, 13.0)])
+    index = snapshot.DistrictIndex(
+        ["West", "East"], ["west", "east"], [400_000.0, 600_000.0], geometries, {"west": 400_000, "east": 600_000}
+    )
+    monkeypatch.setattr(snapshot, "_index", index)
+    return index
+
+
+@pytest.fixture
+def osrm_stub(monkeypatch):
+    server, url = start_stub_server()
+    monkeypatch.setattr(osm_utils, "OSRM_URL", url)
+    osm_utils.OSRM_CACHE.clear()
+    yield url
+    server.shutdown()
+    osm_utils.OSRM_CACHE.clear()
+
+
+@pytest.fixture
+def demand_records():
+    rng = np.random.default_rng(7)
+    return [
+        {"id": i + 1, "lat": float(12.1 + rng.random() * 0.8), "lon": float(77.1 + rng.random() * 0.8),
+         "population": int(rng.integers(1_000, 10_000))}
+        for i in range(30)
+    ]
+
+
+@pytest.fixture
+def api_client(district_index, osrm_stub, tmp_path, monkeypatch):
+    """
+    Flask test client writing its maps and tables to a temporary directory.
+    """
+    import api
+
+    monkeypatch.setattr(api, "MAPS_FOLDER", str(tmp_path))
+    api.app.config["TESTING"] = True
+    return api.app.test_client()
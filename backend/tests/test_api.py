@@ -0,0 +1,22 @@
+def test_coverage_mode_end_to_end(api_client, demand_records):
+    response = api_client.post("/demand-centers", json={
+        "demandCenters": demand_records, "mode": "coverage", "nOutlets": 3, "coverageRadius": 20,
+    })
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body["outlets"]) == 3
+    assert body["assignments"]
+    outlet_ids = {outlet["id"] for outlet in body["outlets"]}
+    assert {a["outlet_id"] for a in body["assignments"]} <= outlet_ids
+    assert all(0 <= a["distance"] <= 20 for a in body["assignments"])
+    assert api_client.get(body["map_url"]).status_code == 200
+
+
+def test_invalid_solver_options_are_rejected(api_client, demand_records):
+    for options in ({"nOutlets": "three"}, {"nOutlets": 0}, {"coverageRadius": -5}, {"coverageRadius": "far"}):
+        body = dict({"demandCenters": demand_records, "mode": "coverage"}, **options)
+        for route in ("/demand-centers", "/jobs"):
+            response = api_client.post(route, json=body)
+            assert response.status_code == 400, (route, options)
+            assert next(iter(options)) in response.get_json()["error"]
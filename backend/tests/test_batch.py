@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import pytest
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_batch_sweep_holds_outlet_count_and_cost_falls(api_client, demand_records):
+    response = api_client.post("/demand-centers/batch", json={"demandCenters": demand_records, "pRange": [3, 6]})
+
+    assert response.status_code == 200
+    lines = read_ndjson(response)
+    scenarios = [line for line in lines if line["type"] == "scenario"]
+    summary = lines[-1]
+    assert summary["type"] == "summary" and summary["completed"] == 4
+
+    for scenario in scenarios:
+        assert scenario["outletsKept"] == scenario["nOutlets"] == scenario["params"]["nOutlets"]
+        assert len(scenario["outlets"]) == scenario["nOutlets"]
+
+    curve = summary["curve"]
+    assert [point["nOutlets"] for point in curve] == [3, 4, 5, 6]
+    costs = [point["cost"] for point in curve]
+    assert all(later <= earlier for earlier, later in zip(costs, costs[1:]))
+
+
+def test_cost_tables_fall_back_to_straight_lines_for_unreachable_pairs():
+    import networkx as nx
+    import pandas as pd
+
+    from edge_costs import straight_line_cost
+    from optimization import haversine_matrix, precompute_cost_tables
+
+    graph = nx.Graph()
+    graph.add_edge((77.0, 12.0), (77.1, 12.0), weight=10.9)
+    graph.add_edge((77.5, 12.5), (77.6, 12.5), weight=10.9)  # Separate component: no route to the outlets
+    outlets = pd.DataFrame({"id": [1, 2], "lat": [12.0, 12.0], "lon": [77.0, 77.1]})
+    demand_centers = pd.DataFrame({"id": [10, 11, 12], "lat": [12.0, 12.5, 12.5], "lon": [77.1, 77.5, 77.6]})
+
+    tables = precompute_cost_tables(outlets, demand_centers, graph, costs=("distance", "peak"))
+
+    straight = haversine_matrix(outlets, demand_centers)
+    for cost, table in tables.items():
+        matrix = table["distance"].to_numpy().reshape(2, 3)
+        assert np.isfinite(matrix).all()
+        expected = [straight_line_cost(km, cost) for km in straight[:, 1:].ravel()]
+        assert matrix[:, 1:].ravel() == pytest.approx(expected, rel=1e-5)
+    assert tables["distance"]["distance"].iloc[0] == pytest.approx(10.9)
+
+
+def test_batch_sweeps_several_cost_types(api_client, demand_records):
+    response = api_client.post("/demand-centers/batch", json={
+        "demandCenters": demand_records,
+        "scenarios": [{"nOutlets": 3, "costType": "distance"}, {"nOutlets": 3, "costType": "peak"}],
+    })
+
+    assert response.status_code == 200
+    summary = read_ndjson(response)[-1]
+    assert summary["completed"] == 2
+
+
+def test_batch_rejects_unknown_profile(api_client, demand_records):
+    response = api_client.post("/demand-centers/batch", json={
+        "demandCenters": demand_records, "pRange": [3, 4], "routingProfile": "driving/../../admin",
+    })
+
+    assert response.status_code == 400
+    assert "routingProfile" in response.get_json()["error"]
+
+
+def test_shared_route_traversal_sums_costs_along_the_routes():
+    import networkx as nx
+
+    from benchmarks.synthetic import synthetic_road_graph
+    from edge_costs import COSTS, get_edge_costs
+
+    graph = synthetic_road_graph(150, bbox=(12.0, 77.0, 13.0, 78.0))
+    rng = np.random.default_rng(5)
+    for _, _, data in graph.edges(data=True):
+        data["duration"] = data["weight"] / rng.uniform(10, 80) * 60  # Speeds vary, so fastest != shortest
+    edge_costs = get_edge_costs(graph)
+    nodes = list(graph.nodes)
+    sources, targets = nodes[:5], nodes[5:40]
+
+    matrices = edge_costs.matrices(sources, targets, costs=("distance", "freeflow", "truck"), along="freeflow")
+
+    truck = edge_costs.costs[:, COSTS.index("truck")]
+    for i, source in enumerate(sources):
+        _, paths = nx.single_source_dijkstra(graph, source, weight="duration")
+        for j, target in enumerate(targets):
+            path = paths[target]
+            along_path = sum(truck[graph.edges[a, b]["eid"]] for a, b in zip(path, path[1:]))
+            assert matrices["truck"][i, j] == pytest.approx(along_path, rel=1e-5)
+            assert matrices["distance"][i, j] == pytest.approx(nx.path_weight(graph, path, "weight"), rel=1e-5)
+    separate = edge_costs.matrices(sources, targets, costs=("freeflow", "distance"))
+    assert matrices["freeflow"] == pytest.approx(separate["freeflow"], rel=1e-5)
+    assert (matrices["distance"] >= separate["distance"] - 1e-4).all()
+    assert (matrices["distance"] > separate["distance"] + 1e-3).any()  # Some fastest routes are longer
+
+
+def test_batch_shares_one_traversal_across_cost_types(api_client, demand_records):
+    response = api_client.post("/demand-centers/batch", json={
+        "demandCenters": demand_records, "sharedRoutes": "freeflow",
+        "scenarios": [{"nOutlets": 3, "costType": "distance"}, {"nOutlets": 3, "costType": "peak"}],
+    })
+
+    assert response.status_code == 200
+    assert read_ndjson(response)[-1]["completed"] == 2
+
+    response = api_client.post("/demand-centers/batch", json={
+        "demandCenters": demand_records, "pRange": [3, 4], "sharedRoutes": "teleport",
+    })
+    assert response.status_code == 400
@@ -0,0 +1,19 @@
+from benchmarks.runner import run_benchmarks
+
+
+def test_routing_stages_run_on_the_synthetic_graph():
+    report = run_benchmarks(
+        sizes=(50,), generators=("uniform",), stages=["synthetic_graph", "sparse_distances", "coverage", "map_generation"],
+        trace_memory=False, graph_nodes=200,
+    )
+
+    assert report["graph"] == "synthetic"
+    assert {r["stage"]: r["status"] for r in report["results"]} == {
+        "synthetic_graph": "ok", "sparse_distances": "ok", "coverage": "ok", "map_generation": "ok",
+    }
+
+
+def test_routing_stages_skip_without_their_graph():
+    report = run_benchmarks(sizes=(50,), generators=("uniform",), stages=["sparse_distances"], trace_memory=False)
+
+    assert report["results"][0]["status"] == "skipped: no synthetic road graph"
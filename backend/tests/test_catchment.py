@@ -0,0 +1,21 @@
+import networkx as nx
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_road_graph
+from catchment import compute_catchments
+from osm_utils import find_nearest_node
+
+
+def test_catchments_match_a_dijkstra_from_the_nearest_node():
+    graph = synthetic_road_graph(300, bbox=(12.0, 77.0, 13.0, 78.0))
+    outlets = pd.DataFrame({"id": [1, 2, 3], "lat": [12.2, 12.5, 12.8], "lon": [77.3, 77.5, 77.7]})
+
+    catchments = compute_catchments(outlets, graph, budget=15)
+
+    for catchment, outlet in zip(catchments, outlets.itertuples()):
+        source = find_nearest_node(graph, outlet.lat, outlet.lon)
+        expected = nx.single_source_dijkstra_path_length(graph, source, cutoff=15, weight="weight")
+        assert catchment["outlet_id"] == outlet.id
+        assert catchment["reachable_nodes"] == len(expected)
+        assert catchment["max_cost"] == max(expected.values())
+        assert catchment["geometry"] is not None
@@ -0,0 +1,59 @@
+import json
+
+import pandas as pd
+
+import snapshot
+from district_matching import match_districts, normalize_district
+
+CENSUS = pd.DataFrame({
+    "district": ["bengaluru", "ahmednagar", "north 24 parganas", "mysuru"],
+    "population": [9_621_551, 4_543_159, 10_009_781, 3_001_127],
+})
+
+
+def test_normalization_bridges_spelling_variants():
+    assert normalize_district("Bangalore Urban District") == "bengaluru"
+    assert normalize_district("North Twenty Four Parganas (W.B.)") == "north 24 parganas"
+    assert normalize_district("Mysore") == "mysuru"
+
+
+def test_exact_hits_resolve_after_normalization():
+    populations, report = match_districts(["Bangalore Urban", "Mysore"], CENSUS)
+
+    assert populations == [9_621_551, 3_001_127]
+    assert report["exact"] == 2 and not report["fuzzy"]
+
+
+def test_near_misses_resolve_fuzzily():
+    populations, report = match_districts(["Ahmadnagar", "North Twenty Four Pargana"], CENSUS)
+
+    assert populations == [4_543_159, 10_009_781]
+    assert [entry["census_name"] for entry in report["fuzzy"]] == ["ahmednagar", "north 24 parganas"]
+    assert all(entry["score"] >= 0.8 for entry in report["fuzzy"])
+
+
+def test_unknown_names_stay_unmatched():
+    populations, report = match_districts(["Atlantis", ""], CENSUS)
+
+    assert populations == [None, None]
+    assert [entry["district"] for entry in report["unmatched"]] == ["Atlantis", ""]
+
+
+def test_name_lookup_is_the_same_with_and_without_a_snapshot(tmp_path):
+    districts_file = tmp_path / "districts.geojson"
+    districts_file.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"ID_2": i, "NAME_2": name},
+         "geometry": {"type": "Polygon", "coordinates": [[[i, 0], [i + 1, 0], [i + 1, 1], [i, 1], [i, 0]]]}}
+        for i, name in enumerate(["Bangalore Urban", "Ahmadnagar", "Atlantis"])
+    ]}))
+    population_file = tmp_path / "population.csv"
+    CENSUS.to_csv(population_file, index=False)
+
+    from_sources = snapshot.load_from_sources(str(districts_file), str(population_file))
+    path = snapshot.build_snapshot(str(districts_file), str(population_file), snapshot_root=str(tmp_path / "snapshots"))
+    from_snapshot = snapshot.load_snapshot(path)
+
+    assert from_sources.population_lookup == from_snapshot.population_lookup
+    for name in ("Bangalore Urban", "ahmadnagar", "Bengaluru", "Atlantis"):
+        assert from_sources.population_for_name(name) == from_snapshot.population_for_name(name)
+    assert from_snapshot.population_for_name("Ahmadnagar") == 4_543_159
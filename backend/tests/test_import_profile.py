@@ -0,0 +1,7 @@
+from benchmarks.import_profile import profile_import
+
+
+def test_api_import_defers_heavy_modules():
+    report = profile_import("api", repeat=1)
+
+    assert report["heavy_modules_loaded"] == []
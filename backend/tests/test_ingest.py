@@ -0,0 +1,54 @@
+import io
+
+import pandas as pd
+import pytest
+
+from ingest import read_demand_centers
+
+
+def parquet_bytes(frame):
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def test_missing_csv_ids_continue_after_largest_supplied_id():
+    csv = b"id,lat,lon\n3,12.1,77.1\n,12.2,77.2\n,12.3,77.3\n"
+
+    demand_centers = read_demand_centers(io.BytesIO(csv), "csv")
+
+    assert demand_centers["id"].tolist() == [3, 4, 5]
+
+
+def test_missing_parquet_ids_do_not_collide():
+    frame = pd.DataFrame({"id": pd.array([None, 1, 2], dtype="Int64"), "lat": [12.1, 12.2, 12.3], "lon": [77.1, 77.2, 77.3]})
+
+    demand_centers = read_demand_centers(io.BytesIO(parquet_bytes(frame)), "parquet")
+
+    assert demand_centers["id"].tolist() == [3, 1, 2]
+
+
+def test_ids_generated_across_chunks_are_unique():
+    rows = "".join(f"{'' if i % 2 else i + 100},12.{i},77.{i}\n" for i in range(10))
+    csv = ("id,lat,lon\n" + rows).encode()
+
+    demand_centers = read_demand_centers(io.BytesIO(csv), "csv", chunksize=3)
+
+    assert demand_centers["id"].is_unique
+    assert demand_centers["id"].min() >= 100
+
+
+def test_duplicate_supplied_ids_are_rejected():
+    csv = b"id,lat,lon\n1,12.1,77.1\n1,12.2,77.2\n"
+
+    with pytest.raises(ValueError, match="duplicate ids 1"):
+        read_demand_centers(io.BytesIO(csv), "csv")
+
+
+def test_upload_with_duplicate_ids_returns_400(api_client):
+    response = api_client.post(
+        "/demand-centers/upload?format=csv", data=b"id,lat,lon\n7,12.1,77.1\n7,12.2,77.2\n", content_type="text/csv"
+    )
+
+    assert response.status_code == 400
+    assert "duplicate ids" in response.get_json()["error"]
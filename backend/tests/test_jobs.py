@@ -0,0 +1,70 @@
+import threading
+import time
+
+from flask import Response
+
+from jobs import JobRegistry
+
+
+def read_events(response):
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            events.append(lines["event"])
+    return events
+
+
+def wait_until_finished(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.finished_at is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.finished_at is not None
+
+
+def test_job_streams_partial_assignments_before_final(api_client, demand_records):
+    response = api_client.post("/jobs", json={"demandCenters": demand_records, "nOutlets": 5})
+    assert response.status_code == 202
+
+    events = read_events(api_client.get(response.get_json()["events_url"]))
+
+    assert "partial_assignments" in events
+    assert events.index("partial_assignments") < events.index("assignments")
+    assert events[-1] == "done"
+
+
+def test_evicted_job_files_are_removed(tmp_path):
+    def evict(job):
+        for path in tmp_path.glob(f"*_{job.id}.*"):
+            path.unlink()
+
+    def write_map(progress, run_id):
+        (tmp_path / f"map_{run_id}.geojson").write_text("{}")
+        return Response("{}", mimetype="application/json")
+
+    registry = JobRegistry(ttl=0, max_workers=1, on_evict=evict)
+    job = registry.submit(write_map)
+    wait_until_finished(job)
+    assert (tmp_path / f"map_{job.id}.geojson").exists()
+
+    registry.purge_expired()
+
+    assert registry.get(job.id) is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_jobs_beyond_the_pool_size_wait():
+    release = threading.Event()
+
+    def blocked(progress, run_id):
+        release.wait(10)
+        return Response("{}", mimetype="application/json")
+
+    registry = JobRegistry(max_workers=1)
+    first, second = registry.submit(blocked), registry.submit(blocked)
+    time.sleep(0.1)
+    assert (first.status, second.status) == ("running", "queued")
+
+    release.set()
+    wait_until_finished(second)
+    assert second.status == "done"
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from mongo_backend import DistrictResolver, PopulationStore, explode_feature_collection, point_query
+
+BOX = {"type": "Polygon", "coordinates": [[[77.0, 12.0], [78.0, 12.0], [78.0, 13.0], [77.0, 13.0], [77.0, 12.0]]]}
+FEATURE_COLLECTION = {
+    "type": "FeatureCollection",
+    "features": [{"type": "Feature", "properties": {"NAME_2": "Bangalore "}, "geometry": BOX}],
+}
+
+
+@pytest.fixture
+def mongomock_db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()["app_data"]
+
+
+@pytest.fixture
+def mongo_db():
+    """
+    Scratch database on a real server; geo queries cannot run on mongomock.
+    """
+    uri = os.getenv("MONGO_TEST_URI")
+    if not uri:
+        pytest.skip("MONGO_TEST_URI not set")
+    from mongo_backend import create_client
+
+    client = create_client(uri)
+    db = client["geooutletplanner_test"]
+    yield db
+    client.drop_database(db.name)
+
+
+def test_point_query_puts_longitude_first():
+    query = point_query("12.5", 77.25)
+
+    assert query == {"geometry": {"$geoIntersects": {"$geometry": {"type": "Point", "coordinates": [77.25, 12.5]}}}}
+
+
+def test_population_store_batches_and_caches(mongomock_db):
+    collection = mongomock_db["district_population"]
+    collection.insert_many([{"district": "bangalore", "population": 100}, {"district": "mysore", "population": 50}])
+    store = PopulationStore(collection)
+
+    assert store.get_many(["Bangalore", "Mysore", "Atlantis"], default=-1) == {"Bangalore": 100, "Mysore": 50, "Atlantis": -1}
+    collection.delete_many({})
+    assert store.get("bangalore ") == 100
+
+
+def test_explode_feature_collection(mongomock_db):
+    pytest.importorskip("pymongo")
+    source = mongomock_db["districts_geojson"]
+    source.insert_one(FEATURE_COLLECTION)
+
+    assert explode_feature_collection(source, mongomock_db["district_features"]) == 1
+    assert mongomock_db["district_features"].find_one({}, {"_id": 0, "geometry": 0}) == {"name": "Bangalore ", "district": "bangalore"}
+
+
+@pytest.mark.mongodb
+def test_resolver_finds_containing_district(mongo_db):
+    source = mongo_db["districts_geojson"]
+    source.insert_one(FEATURE_COLLECTION)
+    features = mongo_db["district_features"]
+    explode_feature_collection(source, features)
+
+    resolver = DistrictResolver(features, max_workers=2)
+
+    assert resolver.resolve([12.5, 12.5, 20.0], [77.5, 77.5, 70.0]) == ["bangalore", "bangalore", "Unknown"]
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_road_graph
+from metrics import stage_listener
+from optimization import precompute_distances
+from osm_utils import calculate_road_distance
+
+
+def test_default_distance_matrix_reports_snapping():
+    graph = synthetic_road_graph(200, bbox=(12.0, 77.0, 13.0, 78.0))
+    outlets = pd.DataFrame({"id": [1, 2], "lat": [12.2, 12.7], "lon": [77.2, 77.8]})
+    demand_centers = pd.DataFrame({"id": [10, 11, 12], "lat": [12.1, 12.5, 12.9], "lon": [77.5, 77.5, 77.1]})
+    stages = []
+
+    with stage_listener(lambda stage, seconds, info: stages.append(stage)):
+        distances = precompute_distances(outlets, demand_centers, graph, cost="peak")
+
+    assert stages == ["snapping", "distance_matrix"]
+    expected = [
+        calculate_road_distance(graph, o.lat, o.lon, d.lat, d.lon, cost="peak")
+        for o in outlets.itertuples() for d in demand_centers.itertuples()
+    ]
+    assert distances["distance"].tolist() == expected
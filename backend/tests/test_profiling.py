@@ -0,0 +1,54 @@
+import pytest
+
+import api
+import profiling
+
+
+@pytest.fixture
+def profiling_client(api_client, tmp_path, monkeypatch):
+    profile_dir = tmp_path / "profiles"
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(profile_dir))
+    monkeypatch.setattr(api, "PROFILE_DIR", str(profile_dir))
+    return api_client
+
+
+def test_profiles_are_private(profiling_client, demand_records):
+    response = profiling_client.post(
+        "/demand-centers", json={"demandCenters": demand_records}, headers={"X-Profile": "1", "X-Profile-Token": "secret"}
+    )
+
+    assert response.status_code == 200
+    profile_url = response.headers["X-Profile-Url"]
+    filename = profile_url.rsplit("/", 1)[1]
+    assert profile_url.startswith("/profiles/")
+    assert profiling_client.get(f"/download/{filename}").status_code == 404
+    assert profiling_client.get(profile_url).status_code == 404
+    assert profiling_client.get(profile_url, headers={"X-Profile-Token": "wrong"}).status_code == 404
+    assert profiling_client.get(profile_url, headers={"X-Profile-Token": "secret"}).status_code == 200
+
+
+def test_request_profiling_and_routing_profile_are_separate_options(profiling_client, demand_records, monkeypatch):
+    routed = []
+    load_graph = api.load_graph_from_osrm_route
+
+    def recording_load_graph(*bbox, profile):
+        routed.append(profile)
+        return load_graph(*bbox, profile=profile)
+
+    monkeypatch.setattr(api, "load_graph_from_osrm_route", recording_load_graph)
+
+    response = profiling_client.post(
+        "/demand-centers?profile=cprofile&routingProfile=cycling", json={"demandCenters": demand_records},
+        headers={"X-Profile-Token": "secret"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Url"].endswith(".pstats")
+    assert routed == ["cycling"]
+
+    response = profiling_client.post("/demand-centers?routingProfile=walking", json={"demandCenters": demand_records})
+    assert response.status_code == 200
+    assert "X-Profile-Url" not in response.headers
+    assert routed == ["cycling", "walking"]
@@ -0,0 +1,72 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from scraper import parse_rows, scrape
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "census_page.html")
+EXPECTED_ROWS = [["Thane", 11060148], ["North Twenty Four Parganas", 10009781], ["Bangalore", 9621551]]
+
+
+@pytest.fixture
+def census_server():
+    """
+    Serves the fixture as page 1 with an ETag, 404 for every other page, and records each request.
+    """
+    with open(FIXTURE, "rb") as f:
+        page = f.read()
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            number = parse_qs(urlsplit(self.path).query).get("page", ["1"])[0]
+            requests_seen.append((number, self.headers.get("If-None-Match")))
+            if number != "1":
+                self.send_response(404)
+                self.end_headers()
+            elif self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/district.php?page={{page}}", requests_seen
+    server.shutdown()
+
+
+def test_parse_rows_without_tbody():
+    with open(FIXTURE, "rb") as f:
+        assert parse_rows(f.read()) == EXPECTED_ROWS
+
+
+def test_parse_rows_with_tbody():
+    page = b"<table class='table'><thead><tr><th>#</th></tr></thead><tbody><tr><td>1</td><td>Pune</td><td>MH</td><td>9,429,408</td></tr></tbody></table>"
+
+    assert parse_rows(page) == [["Pune", 9429408]]
+
+
+def test_scrape_reuses_rows_on_304(census_server, tmp_path):
+    url, requests_seen = census_server
+    state_file = str(tmp_path / "state.json")
+
+    rows, changed = scrape(url, max_pages=3, concurrency=1, min_interval=0, state_file=state_file)
+    assert rows == EXPECTED_ROWS
+    assert changed
+
+    requests_seen.clear()
+    rows, changed = scrape(url, max_pages=3, concurrency=1, min_interval=0, state_file=state_file)
+    assert rows == EXPECTED_ROWS
+    assert not changed
+    assert requests_seen[0] == ("1", '"v1"')
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_road_graph
+from optimization import assign_demand_to_outlets_fast, optimize_outlet_location_fast, precompute_cost_tables
+from sparse_distances import build_sparse_distances
+
+
+@pytest.fixture(scope="module")
+def network():
+    """
+    Synthetic graph with outlets and demand centers placed on its nodes, so every snapping method agrees.
+    """
+    graph = synthetic_road_graph(300, bbox=(12.0, 77.0, 13.0, 78.0))
+    nodes = list(graph.nodes)
+    rng = np.random.default_rng(3)
+    picks = rng.choice(len(nodes), 60, replace=False)
+    points = pd.DataFrame([{"lat": nodes[i][1], "lon": nodes[i][0]} for i in picks])
+    outlets = points.iloc[:20].reset_index(drop=True).assign(id=range(1, 21))
+    demand_centers = points.iloc[20:].reset_index(drop=True).assign(id=range(101, 141), population=1000)
+    dense = precompute_cost_tables(outlets, demand_centers, graph, costs=("distance",))["distance"]
+    return graph, outlets, demand_centers, dense.set_index(["outlet_id", "demand_id"])["distance"]
+
+
+def test_stored_neighbours_match_the_dense_matrix(network):
+    graph, outlets, demand_centers, dense = network
+    sparse = build_sparse_distances(outlets, demand_centers, graph, k=4)
+
+    for demand_pos, demand_id in enumerate(sparse.demand_ids):
+        start, end = sparse.indptr[demand_pos], sparse.indptr[demand_pos + 1]
+        for candidate_pos, value in zip(sparse.indices[start:end], sparse.data[start:end]):
+            assert value == pytest.approx(dense[sparse.outlet_ids[candidate_pos], demand_id], rel=1e-5)
+
+
+def test_pairs_outside_the_neighbourhood_are_routed(network):
+    graph, outlets, demand_centers, dense = network
+    sparse = build_sparse_distances(outlets, demand_centers, graph, k=2)
+    stored = set(sparse.indices[sparse.indptr[0]:sparse.indptr[1]])
+    outside = next(pos for pos in range(len(outlets)) if pos not in stored)
+
+    routed = sparse.pair(0, outside)
+
+    assert routed == pytest.approx(dense[sparse.outlet_ids[outside], sparse.demand_ids[0]], rel=1e-5)
+    assert sparse._cache == {(0, outside): routed}
+
+
+def test_nearest_on_a_restricted_view_matches_dense_assignment(network):
+    graph, outlets, demand_centers, dense = network
+    sparse = build_sparse_distances(outlets, demand_centers, graph)
+    kept = outlets["id"].iloc[::10].tolist()
+
+    nearest = sparse.restrict(kept).nearest()
+    expected = assign_demand_to_outlets_fast(dense[dense.index.isin(kept, level=0)].reset_index(), demand_centers)
+
+    assert sparse.active.all()  # The view does not touch the full table
+    assert sparse._cache  # Some rows lost all stored neighbours and were routed
+    merged = nearest.merge(expected, on="demand_id", suffixes=("", "_dense"))
+    assert len(merged) == len(demand_centers)
+    assert (merged["outlet_id"] == merged["outlet_id_dense"]).all()
+    assert merged["distance"].to_numpy() == pytest.approx(merged["distance_dense"].to_numpy(), rel=1e-5)
+
+
+def test_nearest_is_exact_within_the_stored_neighbourhood(network):
+    graph, outlets, demand_centers, dense = network
+    sparse = build_sparse_distances(outlets, demand_centers, graph, k=2)
+
+    nearest = sparse.nearest().set_index("demand_id")
+    expected = assign_demand_to_outlets_fast(dense.reset_index(), demand_centers).set_index("demand_id")
+
+    for demand_pos, demand_id in enumerate(sparse.demand_ids):
+        stored = sparse.outlet_ids[sparse.indices[sparse.indptr[demand_pos]:sparse.indptr[demand_pos + 1]]]
+        if expected.loc[demand_id, "outlet_id"] in stored:
+            assert nearest.loc[demand_id, "outlet_id"] == expected.loc[demand_id, "outlet_id"]
+        else:  # The road-nearest outlet is not among the k straight-line neighbours
+            assert nearest.loc[demand_id, "distance"] >= expected.loc[demand_id, "distance"]
+
+
+def test_solver_agrees_with_the_dense_path(network):
+    graph, outlets, demand_centers, dense = network
+    # Every candidate stored, so the drop loop's restricted views must reproduce the dense run exactly
+    sparse = build_sparse_distances(outlets, demand_centers, graph, k=len(outlets))
+
+    dense_assignments, dense_outlets = optimize_outlet_location_fast(
+        outlets, demand_centers, graph, distances=dense.reset_index()
+    )
+    sparse_assignments, sparse_outlets = optimize_outlet_location_fast(outlets, demand_centers, graph, distances=sparse)
+
+    dense_assignments = dense_assignments.sort_values("demand_id").reset_index(drop=True)
+    sparse_assignments = sparse_assignments.sort_values("demand_id").reset_index(drop=True)
+    assert sparse_assignments["outlet_id"].tolist() == dense_assignments["outlet_id"].tolist()
+    assert sparse_assignments["distance"].to_numpy() == pytest.approx(
+        dense_assignments["distance"].to_numpy(), rel=1e-5
+    )
+    assert sorted(sparse_outlets["id"]) == sorted(dense_outlets["id"])
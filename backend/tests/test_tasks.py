@@ -0,0 +1,96 @@
+import pytest
+
+import task_queue
+from worker import Worker
+
+
+@pytest.fixture
+def sqlite_queue(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'tasks.sqlite3'}"
+    monkeypatch.setattr(task_queue, "TASK_QUEUE_URL", url)
+    yield task_queue.get_queue(url)
+    task_queue._queues.pop(url, None)
+
+
+def test_worker_result_links_resolve(api_client, demand_records, sqlite_queue):
+    response = api_client.post("/tasks", json={"demandCenters": demand_records, "nOutlets": 3})
+    assert response.status_code == 202
+    status_url = response.get_json()["status_url"]
+
+    assert Worker(sqlite_queue).run_once()
+
+    body = api_client.get(status_url).get_json()
+    assert body["status"] == "done"
+    result = body["result"]
+    links = [result["map_url"], *result["tables"].values()]
+    assert sorted(links) == sorted(body["artifacts"].values())
+    for url in links:
+        assert api_client.get(url).status_code == 200
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return task_queue.SQLiteQueue(str(tmp_path / "tasks.sqlite3"))
+    import fakeredis
+
+    return task_queue.RedisQueue(fakeredis.FakeRedis())
+
+
+def test_only_the_owner_finishes_a_task(queue):
+    task_id = queue.enqueue({"n": 1}, max_attempts=2)
+    assert queue.claim("w1")["id"] == task_id
+
+    assert not queue.complete(task_id, "w2", {"ok": True})
+    assert not queue.heartbeat(task_id, "w2")
+    assert queue.heartbeat(task_id, "w1")
+    assert queue.complete(task_id, "w1", {"ok": True}, {"map.geojson": b"{}"})
+
+    task = queue.get(task_id)
+    assert (task["status"], task["result"], task["artifacts"]) == ("done", {"ok": True}, ["map.geojson"])
+    assert not queue.fail(task_id, "w1", "too late")
+
+
+def test_stale_task_is_requeued_and_its_worker_loses_it(queue):
+    task_id = queue.enqueue({"n": 1}, max_attempts=2)
+    queue.claim("w1")
+
+    assert queue.requeue_stale(stale_after=-1) == 1
+
+    task = queue.get(task_id)
+    assert (task["status"], task["error"]) == ("queued", "Worker heartbeat lost")
+    assert not queue.complete(task_id, "w1", {"ok": True})
+    assert queue.requeue_stale(stale_after=-1) == 0
+
+
+def test_redis_requeue_clears_the_running_set():
+    import fakeredis
+
+    queue = task_queue.RedisQueue(fakeredis.FakeRedis())
+    task_id = queue.enqueue({"n": 1})
+    queue.claim("w1")
+    queue.redis.zadd(queue.running, {"expired-task": 0})
+
+    assert queue.requeue_stale(stale_after=-1) == 1
+
+    assert queue.redis.zcard(queue.running) == 0
+    assert queue.redis.zscore(queue.delayed, task_id) is not None
+
+
+def test_redis_ownership_check_retries_after_a_concurrent_change():
+    import fakeredis
+
+    queue = task_queue.RedisQueue(fakeredis.FakeRedis())
+    task_id = queue.enqueue({"n": 1})
+    queue.claim("w1")
+    checks = []
+
+    def owned(task):
+        checks.append(task["worker"])
+        if len(checks) == 1:  # Another node takes the task between the read and the write
+            queue.redis.hset(queue._key(task_id), "worker", "w2")
+        return task["worker"] == "w1"
+
+    assert queue._update_task(task_id, owned, lambda pipe, task: pipe.hset(queue._key(task_id), "status", "done")) is None
+    assert checks == ["w1", "w2"]
+    assert queue.get(task_id)["status"] == "running"
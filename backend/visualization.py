@@ -1,9 +1,8 @@
 import json
-import geopandas as gpd
-from shapely.geometry import LineString
 import logging
 # In visualization.py
 from osm_utils import get_osrm_route  # Correct the import source
+from catchment import catchment_features
 
 
 
@@ -12,6 +11,8 @@ def create_geodataframes(outlets, demand_centers):
     """
     Convert outlets and demand centers into GeoDataFrames.
     """
+    import geopandas as gpd
+
     demand_gdf = gpd.GeoDataFrame(
         demand_centers,
         geometry=gpd.points_from_xy(demand_centers['lon'], demand_centers['lat']),
@@ -30,6 +31,8 @@ def create_connection_features(assignments, demand_gdf, outlet_gdf, road_graph):
     Generate GeoJSON LineString features for connections between demand centers and outlets
     using OSRM road network.
     """
+    from shapely.geometry import LineString
+
     connection_features = []
 
     for _, assignment in assignments.iterrows():
@@ -52,15 +55,17 @@ def create_connection_features(assignments, demand_gdf, outlet_gdf, road_graph):
                 }
             })
         else:
-            logging.warning(f"No route found between demand {assignment['demand_id']} and outlet {assignment['outlet_id']}")
+            logging.warning("No route found between demand %s and outlet %s", assignment['demand_id'], assignment['outlet_id'])
             
     return connection_features
 
 
-def visualize_map(outlets, demand_centers, assignments, road_graph, map_file_path):
+def visualize_map(outlets, demand_centers, assignments, road_graph, map_file_path=None, catchments=None):
     """
     Visualize the optimized retail map and save it as a GeoJSON file, 
     using OSRM roads to connect outlets and demand centers.
+    Optional outlet catchments are added as polygon features.
+    Returns the GeoJSON dict; the file is only written when map_file_path is given.
     """
     try:
         # Convert data into GeoDataFrames
@@ -104,12 +109,18 @@ def visualize_map(outlets, demand_centers, assignments, road_graph, map_file_pat
         # Add connection features using OSRM routes
         features += create_connection_features(assignments, demand_gdf, outlet_gdf, road_graph)
 
+        # Add catchment polygons
+        if catchments:
+            features += catchment_features(catchments)
+
         # Construct GeoJSON
         geojson_data = {'type': 'FeatureCollection', 'features': features}
 
         # Save GeoJSON to file
-        with open(map_file_path, 'w') as f:
-            json.dump(geojson_data, f, indent=2)
+        if map_file_path:
+            with open(map_file_path, 'w') as f:
+                json.dump(geojson_data, f, indent=2)
+        return geojson_data
 
     except Exception as e:
         raise RuntimeError(f"Error generating GeoJSON map: {e}")
@@ -0,0 +1,151 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+
+from task_queue import TASK_QUEUE_URL, get_queue
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = float(os.getenv("TASK_HEARTBEAT_SECONDS", "10"))
+POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", "1"))
+
+
+def run_pipeline_task(task):
+    """
+    Run the optimization pipeline for one queued task.
+    Returns (response JSON, artifacts) where artifacts holds the map and result tables as bytes,
+    so they can be served from the queue backend rather than from this node's disk. The map and
+    table URLs in the result are rewritten to those stored copies, which expire with the result.
+    """
+    import pandas as pd
+    from api import MAPS_FOLDER, process_demand_centers  # Deferred: loads the full pipeline only in workers
+
+    payload = task["payload"]
+    demand_centers = pd.DataFrame(payload["demandCenters"]).rename(columns={'latitude': 'lat', 'longitude': 'lon'})
+    response = process_demand_centers(demand_centers, payload.get("options", {}), 'json', run_id=task["id"])
+    result = json.loads(response.get_data())
+    if response.status_code >= 400:
+        raise RuntimeError(result.get("error", f"Pipeline returned {response.status_code}"))
+
+    artifacts = {}
+
+    def store(url):
+        filename = os.path.basename(url.split("?")[0])
+        path = os.path.join(MAPS_FOLDER, filename)
+        with open(path, "rb") as f:
+            artifacts[filename] = f.read()
+        os.remove(path)  # The queue backend now holds the only copy
+        return f"/tasks/{task['id']}/artifacts/{filename}"
+
+    if result.get("map_url"):
+        result["map_url"] = store(result["map_url"])
+    result["tables"] = {name: store(url) for name, url in result.get("tables", {}).items()}
+    return result, artifacts
+
+
+class Heartbeat:
+    """
+    Refresh a claimed task's heartbeat from a background thread while it runs.
+    """
+
+    def __init__(self, queue, task_id, worker_id, interval=HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{task_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.task_id, self.worker_id):
+                    logger.warning("Task %s is no longer owned by %s.", self.task_id, self.worker_id)
+                    return
+            except Exception as e:
+                logger.error("Heartbeat for task %s failed: %s", self.task_id, e)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+class Worker:
+    """
+    Pulls tasks from the queue and runs them one at a time. Start one per core, on one host with the
+    SQLite queue or on as many nodes as needed with Redis; stale tasks of crashed workers are re-queued
+    by whichever worker polls next.
+    """
+
+    def __init__(self, queue, worker_id=None, execute=run_pipeline_task, poll_interval=POLL_SECONDS,
+                 heartbeat_interval=HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.execute = execute
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stopping = threading.Event()
+
+    def run_once(self):
+        """
+        Claim and run one task. Returns False when the queue had nothing ready.
+        """
+        requeued = self.queue.requeue_stale()
+        if requeued:
+            logger.warning("Re-queued %d tasks with lost heartbeats.", requeued)
+        task = self.queue.claim(self.worker_id)
+        if task is None:
+            return False
+
+        logger.info("Worker %s running task %s (attempt %d).", self.worker_id, task['id'], task['attempts'])
+        try:
+            with Heartbeat(self.queue, task["id"], self.worker_id, self.heartbeat_interval):
+                result, artifacts = self.execute(task)
+        except Exception as e:
+            logger.error("Task %s failed: %s", task['id'], e)
+            self.queue.fail(task["id"], self.worker_id, str(e))
+        else:
+            if not self.queue.complete(task["id"], self.worker_id, result, artifacts):
+                logger.warning("Task %s was re-queued while running; result discarded.", task['id'])
+        return True
+
+    def run(self, max_tasks=None):
+        """
+        Process tasks until stopped (SIGTERM/SIGINT finish the current task first) or max_tasks are done.
+        """
+        done = 0
+        while not self.stopping.is_set() and (max_tasks is None or done < max_tasks):
+            if self.run_once():
+                done += 1
+            else:
+                self.stopping.wait(self.poll_interval)
+        return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run optimization tasks from the task queue.")
+    parser.add_argument("--queue", default=TASK_QUEUE_URL, help="sqlite:///<path> or redis://host:port/db")
+    parser.add_argument("--max-tasks", type=int, help="Exit after this many tasks")
+    parser.add_argument("--drain", action="store_true", help="Exit once no task is ready")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s - %(levelname)s - %(message)s")
+
+    worker = Worker(get_queue(args.queue))
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: worker.stopping.set())
+    logger.info("Worker %s polling %s.", worker.worker_id, args.queue)
+    if args.drain:
+        while not worker.stopping.is_set() and worker.run_once():
+            pass
+    else:
+        worker.run(args.max_tasks)